@@ -0,0 +1,277 @@
+# benchmark.py
+# 네트워크/Google Drive 없이 도는 디코드 → 전처리 → 추론 → 렌더링 벤치마크.
+#
+#   python benchmark.py                         # fastai 가 있으면 작은 로컬 Learner, 없으면 스텁
+#   python benchmark.py --learner stub --repeat 50
+#   python benchmark.py --learner model.pkl     # 로컬에 있는 실제 모델 (model.ts 도 가능)
+#   python benchmark.py --compare bench_results/이전결과.json
+#
+# 결과는 bench_results/bench-<시각>.json 으로 저장 (p50/p95/p99, 처리량, 단계별 RSS 증감, 최대 RSS).
+import os, sys, json, time, argparse, platform, tempfile
+from io import BytesIO
+from types import SimpleNamespace
+import numpy as np
+from PIL import Image, features
+
+from image_pipeline import load_pil_from_bytes, model_input_size, predict_batch, render_prob_bars
+from inference import InferenceWorker
+from metrics import Registry
+
+DEFAULT_SIZES = "640x480,1920x1080,4032x3024"
+DEFAULT_FORMATS = "jpg,jpg-exif,png,webp,tiff"
+
+# ======================
+# 학습기: 스텁 / 작은 fastai Learner / 로컬 모델 파일
+# ======================
+class StubLearner:
+    """dls.vocab / predict / predict_batch 만 갖춘 numpy 스텁 (torch, fastai 불필요)."""
+
+    def __init__(self, n_labels: int = 3, size: tuple[int, int] = (224, 224)):
+        self.size = size
+        self.dls = SimpleNamespace(vocab=[f"label_{i}" for i in range(n_labels)])
+        self._w = np.random.default_rng(0).standard_normal((3, n_labels)).astype(np.float32)
+
+    def preprocess(self, pil: Image.Image) -> np.ndarray:
+        return np.asarray(pil.resize(self.size, Image.BILINEAR), dtype=np.uint8)
+
+    def predict_batch(self, pils) -> np.ndarray:
+        x = np.stack([self.preprocess(p) for p in pils]).astype(np.float32) / 255.0
+        logits = x.mean(axis=(1, 2)) @ self._w
+        e = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return e / e.sum(axis=1, keepdims=True)
+
+    def predict(self, item):
+        probs = self.predict_batch([item])[0]
+        idx = int(probs.argmax())
+        return self.dls.vocab[idx], idx, probs
+
+def build_tiny_learner(n_labels: int = 3, size: int = 224):
+    """합성 이미지 폴더로 만든 학습 안 된 작은 CNN Learner (실제 fastai 추론 경로 측정용)."""
+    from torch import nn
+    from fastai.vision.all import (DataBlock, ImageBlock, CategoryBlock, Resize, Normalize, Learner,
+                                   RandomSplitter, CrossEntropyLossFlat, get_image_files, parent_label,
+                                   imagenet_stats)
+    # 학습 데이터는 vocab/변환 구성에만 쓰이고 추론은 test_dl 로 하므로 폴더는 바로 지워도 됨.
+    # num_workers 는 fastai 기본값 그대로 (추론 경로는 앱과 같이 test_dl 에서 0 으로 지정)
+    with tempfile.TemporaryDirectory(prefix="bench-data-") as root:
+        rng = np.random.default_rng(0)
+        for i in range(n_labels):
+            os.makedirs(os.path.join(root, f"label_{i}"))
+            for j in range(4):
+                arr = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+                Image.fromarray(arr).save(os.path.join(root, f"label_{i}", f"{j}.jpg"))
+        dls = DataBlock(
+            blocks=(ImageBlock, CategoryBlock), get_items=get_image_files, get_y=parent_label,
+            splitter=RandomSplitter(0.25, seed=0), item_tfms=Resize(size),
+            batch_tfms=Normalize.from_stats(*imagenet_stats),
+        ).dataloaders(root, bs=4)
+    model = nn.Sequential(
+        nn.Conv2d(3, 16, 3, stride=2, padding=1), nn.ReLU(),
+        nn.Conv2d(16, 32, 3, stride=2, padding=1), nn.ReLU(),
+        nn.AdaptiveAvgPool2d(1), nn.Flatten(), nn.Linear(32, len(dls.vocab)),
+    )
+    return Learner(dls, model, loss_func=CrossEntropyLossFlat())
+
+def make_learner(kind: str, n_labels: int):
+    if kind == "stub":
+        return StubLearner(n_labels), "stub"
+    if kind.endswith(".ts"):
+        from torchscript_backend import TorchScriptClassifier
+        return TorchScriptClassifier(kind), "torchscript"
+    if kind.endswith(".pkl"):
+        from fastai.learner import load_learner
+        return load_learner(kind, cpu=True), "fastai"
+    try:
+        return build_tiny_learner(n_labels), "fastai-tiny"
+    except ImportError:
+        if kind == "tiny":
+            raise
+        print("fastai 가 없어 스텁 학습기로 측정합니다.", file=sys.stderr)
+        return StubLearner(n_labels), "stub"
+
+# ======================
+# 합성 입력
+# ======================
+def synth_image(w: int, h: int, seed: int = 0) -> Image.Image:
+    """그라디언트 + 노이즈 (완전 랜덤보다 실제 사진에 가까운 압축률)."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+    base = np.stack([xx / w, yy / h, (xx + yy) / (w + h)], axis=-1) * 255
+    noise = rng.normal(0, 12, (h, w, 3))
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8))
+
+def encode(pil: Image.Image, fmt: str) -> bytes | None:
+    buf = BytesIO()
+    if fmt == "jpg":
+        pil.save(buf, "JPEG", quality=90)
+    elif fmt == "jpg-exif":
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: 90° 회전
+        pil.save(buf, "JPEG", quality=90, exif=exif)
+    elif fmt == "png":
+        pil.save(buf, "PNG")
+    elif fmt == "webp":
+        if not features.check("webp"): return None
+        pil.save(buf, "WEBP", quality=90)
+    elif fmt == "tiff":
+        pil.save(buf, "TIFF")
+    else:
+        raise ValueError(f"알 수 없는 포맷: {fmt}")
+    return buf.getvalue()
+
+# ======================
+# 측정
+# ======================
+def rss_mb() -> float | None:
+    """현재 RSS (psutil 필요). 단계별 증감 계산용."""
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / 2**20
+
+def peak_rss_mb() -> float | None:
+    """프로세스 전체의 최대 RSS — 단계별 값이 아니므로 보고서 최상위에만 기록."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 1024  # macOS 는 바이트, Linux 는 KB
+
+def measure(fn, repeat: int, warmup: int, items_per_call: int = 1) -> dict:
+    rss0 = rss_mb()
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    ms = np.asarray(times) * 1000
+    return {
+        "n": repeat, "items_per_call": items_per_call,
+        "p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)), "mean_ms": float(ms.mean()),
+        "throughput_per_s": float(items_per_call * repeat / max(ms.sum() / 1000, 1e-12)),
+        "rss_delta_mb": None if rss0 is None else rss_mb() - rss0,
+    }
+
+def preprocess_fn(learner):
+    """앱 경로에서 모델 입력 텐서를 만드는 단계."""
+    if hasattr(learner, "preprocess"):
+        return learner.preprocess
+    def _fastai(pil):
+        return learner.dls.test_dl([pil], bs=1, num_workers=0).one_batch()
+    return _fastai
+
+def single_item_fn(kind: str):
+    """기존 단일 이미지 경로의 입력 변환 (PILImage.create(np.array(pil)))."""
+    if kind.startswith("fastai"):
+        from fastai.vision.core import PILImage
+        return lambda pil: PILImage.create(np.array(pil))
+    return lambda pil: pil
+
+def run(args) -> dict:
+    learner, kind = make_learner(args.learner, args.labels)
+    labels = [str(x) for x in learner.dls.vocab]
+    side = max(model_input_size(learner))
+    prep, to_item = preprocess_fn(learner), single_item_fn(kind)
+    results = []
+
+    def record(stage: str, case: str, stats: dict):
+        stats.update(stage=stage, case=case)
+        results.append(stats)
+        print(f"{stage:<16} {case:<22} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f}  "
+              f"p99 {stats['p99_ms']:8.2f}  {stats['throughput_per_s']:8.1f}/s", flush=True)
+
+    decoded_all = []
+    for size in args.sizes.split(","):
+        w, h = (int(v) for v in size.lower().split("x"))
+        src = synth_image(w, h)
+        for fmt in args.formats.split(","):
+            b = encode(src, fmt)
+            if b is None:
+                print(f"건너뜀: {fmt} (Pillow 지원 없음)", file=sys.stderr)
+                continue
+            case = f"{fmt}-{w}x{h}"
+            record("decode_full", case, measure(lambda: load_pil_from_bytes(b), args.repeat, args.warmup))
+            record("decode_sized", case, measure(lambda: load_pil_from_bytes(b, side), args.repeat, args.warmup))
+            pil = load_pil_from_bytes(b, side)
+            decoded_all.append(pil)
+            record("preprocess", case, measure(lambda: prep(pil), args.repeat, args.warmup))
+            record("predict_single", case, measure(lambda: learner.predict(to_item(pil)), args.repeat, args.warmup))
+
+    # 같은 입력 묶음으로 단일 반복 vs 배치 추론 비교
+    bs = args.batch_size
+    batch = (decoded_all * (bs // max(1, len(decoded_all)) + 1))[:bs]
+    def _single_loop():
+        for pil in batch:
+            learner.predict(to_item(pil))
+    record("predict_loop", f"bs{bs}", measure(_single_loop, max(3, args.repeat // 4), 1, bs))
+    # 앱과 같은 경로: 요청마다 submit 하고 워커가 묶어서 forward
+    worker = InferenceWorker(learner, bs, args.max_wait_ms, bs * 2, registry=Registry())
+    def _worker_batch():
+        for fut in [worker.submit(pil, block=True) for pil in batch]:
+            fut.result()
+    record("predict_batched", f"bs{bs}", measure(_worker_batch, max(3, args.repeat // 4), 1, bs))
+    worker.stop()
+
+    probs = predict_batch(learner, batch[:1])[0]
+    for n in sorted({len(labels), args.render_labels}):
+        lbls = labels if n == len(labels) else [f"label_{i}" for i in range(n)]
+        pr = probs if n == len(labels) else np.random.default_rng(0).dirichlet(np.ones(n))
+        def _render():
+            order = np.argsort(-pr)
+            return render_prob_bars([(lbls[i], float(pr[i])) for i in order], lbls[int(order[0])])
+        record("render", f"{n}_labels", measure(_render, args.repeat, args.warmup))
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "platform": platform.platform(), "cpu_count": os.cpu_count(), "learner": kind,
+            "labels": len(labels), "input_side": side, "repeat": args.repeat, "batch_size": bs,
+            "max_wait_ms": args.max_wait_ms,
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "results": results,
+    }
+
+def compare(current: dict, previous_path: str):
+    with open(previous_path, encoding="utf-8") as fp:
+        prev = {(r["stage"], r["case"]): r for r in json.load(fp)["results"]}
+    print(f"\n비교 기준: {previous_path}")
+    for r in current["results"]:
+        old = prev.get((r["stage"], r["case"]))
+        if old:
+            delta = (r["p50_ms"] - old["p50_ms"]) / max(old["p50_ms"], 1e-9) * 100
+            print(f"{r['stage']:<16} {r['case']:<22} p50 {old['p50_ms']:8.2f} → {r['p50_ms']:8.2f} ms ({delta:+.1f}%)")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="오프라인 디코드/추론/렌더링 벤치마크")
+    ap.add_argument("--learner", default="auto", help="auto | tiny | stub | <model.pkl> | <model.ts>")
+    ap.add_argument("--labels", type=int, default=3, help="스텁/작은 Learner 의 라벨 수")
+    ap.add_argument("--sizes", default=DEFAULT_SIZES)
+    ap.add_argument("--formats", default=DEFAULT_FORMATS)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--warmup", type=int, default=2)
+    ap.add_argument("--batch-size", type=int, default=16)
+    ap.add_argument("--max-wait-ms", type=float, default=10, help="워커 배치 대기 시간 (앱의 INFER_MAX_WAIT_MS)")
+    ap.add_argument("--render-labels", type=int, default=1000, help="렌더링 측정용 대규모 라벨 수")
+    ap.add_argument("--out", default=None, help="결과 JSON 경로 (기본: bench_results/bench-<시각>.json)")
+    ap.add_argument("--compare", default=None, help="이전 결과 JSON 과 p50 비교")
+    args = ap.parse_args(argv)
+
+    report = run(args)
+    out = args.out or os.path.join("bench_results", time.strftime("bench-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as fp:
+        json.dump(report, fp, ensure_ascii=False, indent=2)
+    rss = report["peak_rss_mb"]
+    print(f"\n최대 RSS {rss:.1f} MB · 저장: {out}" if rss is not None else f"\n저장: {out}")
+    if args.compare:
+        compare(report, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+# build_content.py
+# content/content.src.json(직접 편집하는 원본) → content/manifest.json + static/content/thumbs/*
+#
+#   python build_content.py
+#
+# - 라벨은 "index"(learner.dls.vocab 순서) 또는 "label"(라벨 이름)로 지정
+# - 로컬 이미지/데이터 URI 는 thumb_side 이하로 줄인 JPEG 를 static/ 에 저장하고 URL 로만 참조
+#   (앱은 .streamlit/config.toml 의 enableStaticServing 으로 /app/static/ 아래를 서빙)
+# - 유튜브 ID/썸네일 URL 은 여기서 미리 계산해 렌더링 시 정규식을 돌리지 않음
+import os, re, sys, json, base64, hashlib
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(ROOT, "content", "content.src.json")
+OUT = os.path.join(ROOT, "content", "manifest.json")
+THUMB_DIR = os.path.join(ROOT, "static", "content", "thumbs")
+THUMB_URL = "app/static/content/thumbs"
+
+def yt_id_from_url(url: str) -> str | None:
+    if not url: return None
+    pats = [r"(?:v=|/)([0-9A-Za-z_-]{11})(?:\?|&|/|$)", r"youtu\.be/([0-9A-Za-z_-]{11})"]
+    for p in pats:
+        m = re.search(p, url)
+        if m: return m.group(1)
+    return None
+
+def pick_top(lst, n):
+    return [x for x in lst if isinstance(x, str) and x.strip()][:n]
+
+def read_image_source(src: str, base_dir: str) -> bytes | None:
+    if src.startswith("data:image/"):
+        return base64.b64decode(src.split(",", 1)[1])
+    if re.match(r"https?://", src):
+        return None  # 원격 이미지는 그대로 참조
+    with open(os.path.join(base_dir, src), "rb") as fp:
+        return fp.read()
+
+def make_thumb(raw: bytes, side: int) -> tuple[bytes, int, int]:
+    from PIL import Image, ImageOps
+    pil = Image.open(BytesIO(raw))  # 헤더만 읽음
+    if pil.format == "JPEG" and max(pil.size) <= side and pil.getexif().get(0x0112, 1) == 1:
+        return raw, *pil.size  # 이미 작고 회전 태그도 없는 JPEG 는 재인코딩하지 않음
+    pil.draft("RGB", (side, side))  # 디코드 전에 걸어야 DCT 축소가 적용됨
+    pil = ImageOps.exif_transpose(pil).convert("RGB")  # 회전을 픽셀에 반영 → width/height 가 실제와 일치
+    pil.thumbnail((side, side), Image.LANCZOS)
+    out = BytesIO()
+    pil.save(out, "JPEG", quality=82, optimize=True, progressive=True)
+    return out.getvalue(), *pil.size
+
+def prune_thumbs(keep: set[str]):
+    """manifest 가 더 이상 참조하지 않는 썸네일 삭제."""
+    for name in os.listdir(THUMB_DIR):
+        if name.endswith(".jpg") and name not in keep:
+            os.remove(os.path.join(THUMB_DIR, name))
+
+def build(src_path: str = SRC, out_path: str = OUT) -> dict:
+    with open(src_path, encoding="utf-8") as fp:
+        src = json.load(fp)
+    side, n = int(src.get("thumb_side", 480)), int(src.get("max_per_kind", 3))
+    base_dir = os.path.dirname(src_path)
+    os.makedirs(THUMB_DIR, exist_ok=True)
+
+    entries, used = [], set()
+    for item in src.get("labels", []):
+        images = []
+        for img in pick_top(item.get("images", []), n):
+            raw = read_image_source(img, base_dir)
+            if raw is None:
+                images.append({"src": img})
+                continue
+            thumb, w, h = make_thumb(raw, side)
+            name = hashlib.sha1(thumb).hexdigest()[:16] + ".jpg"
+            used.add(name)
+            with open(os.path.join(THUMB_DIR, name), "wb") as fp:
+                fp.write(thumb)
+            images.append({"src": f"{THUMB_URL}/{name}", "width": w, "height": h})
+        videos = []
+        for url in pick_top(item.get("videos", []), n):
+            vid = yt_id_from_url(url)
+            videos.append({"url": url, "thumb": f"https://img.youtube.com/vi/{vid}/hqdefault.jpg" if vid else None})
+        entry = {k: item[k] for k in ("index", "label") if k in item}
+        entry.update({"texts": pick_top(item.get("texts", []), n), "images": images, "videos": videos})
+        entries.append(entry)
+
+    manifest = {"version": 1, "labels": entries}
+    with open(out_path, "w", encoding="utf-8") as fp:
+        json.dump(manifest, fp, ensure_ascii=False, indent=2)
+        fp.write("\n")
+    # 썸네일 폴더는 앱이 읽는 기본 manifest 의 것 — 다른 경로로 빌드할 때는 지우지 않음
+    if os.path.abspath(out_path) == OUT:
+        prune_thumbs(used)
+    return manifest
+
+if __name__ == "__main__":
+    args = sys.argv[1:3]
+    m = build(*args)
+    print(f"{len(m['labels'])}개 라벨 → {os.path.relpath(args[1] if len(args) > 1 else OUT)}")
@@ -0,0 +1,68 @@
+# image_pipeline.py
+# 디코드 → 추론 → 렌더링 단계 중 Streamlit 에 의존하지 않는 부분.
+# streamlit_app.py 와 benchmark.py 가 함께 사용.
+from io import BytesIO
+import numpy as np
+from PIL import Image, ImageOps
+
+MAX_IMAGE_PIXELS = 50_000_000  # 디컴프레션 폭탄 방지 기본값
+
+def model_input_size(learner) -> tuple[int, int]:
+    """모델 입력 크기 (w, h). fastai 는 dls.after_item 의 Resize 에서 읽음."""
+    if hasattr(learner, "size"):
+        return tuple(learner.size)
+    for tfm in learner.dls.after_item.fs:
+        if getattr(tfm, "size", None) is not None:
+            return int(tfm.size[0]), int(tfm.size[1])
+    return 224, 224
+
+def load_pil_from_bytes(b: bytes, min_side: int | None = None, max_pixels: int = MAX_IMAGE_PIXELS) -> Image.Image:
+    """min_side 를 주면 짧은 변이 min_side 이상으로 유지되는 선에서 축소 디코드.
+    JPEG 는 draft(DCT 스케일링)로 디코드 자체를 줄이고, 그 외 포맷은 reduce 로 정수배 축소.
+    reduce 는 P/1/I;16 같은 모드를 지원하지 않으므로 RGB 변환 뒤에 적용."""
+    pil = Image.open(BytesIO(b))
+    w, h = pil.size
+    if w * h > max_pixels:
+        raise ValueError(f"이미지가 너무 큽니다 ({w}x{h}, 최대 {max_pixels:,} 픽셀)")
+    if min_side and pil.format == "JPEG":
+        pil.draft("RGB", (min_side, min_side))
+    pil = ImageOps.exif_transpose(pil)
+    if pil.mode != "RGB": pil = pil.convert("RGB")
+    if min_side:
+        factor = min(pil.size) // min_side
+        if factor >= 2:
+            pil = pil.reduce(factor)
+    return pil
+
+def make_preview(pil: Image.Image, side: int = 512) -> Image.Image:
+    """브라우저로 보낼 축소본 (원본은 그대로)."""
+    if max(pil.size) <= side:
+        return pil
+    preview = pil.copy()
+    preview.thumbnail((side, side), Image.BILINEAR)
+    return preview
+
+def predict_batch(learner, pils) -> np.ndarray:
+    """learner.predict 반복 대신 test_dl + get_preds 로 한 번에 추론."""
+    if hasattr(learner, "predict_batch"):  # TorchScript 백엔드
+        return learner.predict_batch(pils)
+    # Learner.predict 와 같이 num_workers=0 — 백그라운드 스레드에서 멀티프로세스 DataLoader 를 띄우지 않음
+    dl = learner.dls.test_dl(pils, bs=max(1, len(pils)), num_workers=0)
+    with learner.no_bar():
+        probs, _ = learner.get_preds(dl=dl)
+    return probs.detach().cpu().numpy()
+
+def render_prob_bars(prob_list, highlight: str) -> str:
+    """확률 막대 전체를 HTML 한 덩어리로 (라벨 수만큼 st.markdown 호출하지 않음)."""
+    cards = []
+    for lbl, p in prob_list:
+        pct = p * 100
+        hi = "highlight" if lbl == highlight else ""
+        cards.append(
+            f'<div class="prob-card">'
+            f'<div style="display:flex;justify-content:space-between;margin-bottom:6px;">'
+            f'<strong>{lbl}</strong><span>{pct:.2f}%</span></div>'
+            f'<div class="prob-bar-bg"><div class="prob-bar-fg {hi}" style="width:{pct:.4f}%;"></div></div>'
+            f'</div>'
+        )
+    return "".join(cards)
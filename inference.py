@@ -0,0 +1,178 @@
+# inference.py
+# 세션 간에 공유하는 추론 구성요소 — 예측 캐시(LRU)와 마이크로 배칭 워커.
+# Streamlit 에 의존하지 않으므로 앱에서는 st.cache_resource 로 한 번만 만들고, 테스트에서는 그대로 씀.
+import time, queue, hashlib, threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from image_pipeline import predict_batch
+from metrics import REGISTRY, Registry
+
+def bytes_digest(b: bytes) -> str:
+    return hashlib.blake2b(b, digest_size=16).hexdigest()
+
+# ======================
+# 예측 캐시
+# ======================
+class PredictionCache:
+    """(pred, pred_idx, probs) 를 담는 스레드 안전 LRU. 개수/바이트 상한 + TTL."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries, self.max_bytes, self.ttl = max_entries, max_bytes, ttl
+        self._data: OrderedDict[str, tuple[float, int, tuple]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.model_fp = None
+        self.hits = self.misses = self.evictions = 0
+
+    def _drop(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def bind_model(self, fp: str):
+        """모델 지문이 바뀌면 전체 무효화."""
+        with self._lock:
+            if self.model_fp != fp:
+                self._data.clear()
+                self._bytes = 0
+                self.model_fp = fp
+
+    def get(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            ts, _, value = item
+            if self.ttl > 0 and now - ts > self.ttl:
+                self._drop(key)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: tuple):
+        pred, _, probs = value
+        size = int(getattr(probs, "nbytes", 0)) + len(str(pred).encode()) + len(key) + 64
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.monotonic(), size, value)
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._data), "bytes": self._bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+# ======================
+# 마이크로 배칭 워커
+# ======================
+class InferenceWorker:
+    """백그라운드 스레드 하나가 learner 를 독점. submit() 은 Future 를 돌려줌.
+    큐가 가득 차면 queue.Full 을 던져 호출 측에서 혼잡을 알릴 수 있게 함."""
+
+    _STOP = object()  # 큐에 넣으면 남은 배치를 처리한 뒤 스레드 종료
+
+    def __init__(self, learner, max_batch: int, max_wait_ms: float, queue_max: int,
+                 registry: Registry = REGISTRY):
+        self.learner = learner
+        self.labels = [str(x) for x in learner.dls.vocab]
+        self.max_batch, self.max_wait = max(1, max_batch), max_wait_ms / 1000
+        self.lock = threading.Lock()  # learner 를 직접 쓰는 다른 경로도 이 락을 잡아야 함
+        self._q: queue.Queue = queue.Queue(maxsize=queue_max)
+        self._stopping = False
+        self._stage = registry.histogram("stage_seconds", "Per-stage latency (model_load, decode, predict, render_*)")
+        self._errors = registry.counter("errors_total", "Errors by stage")
+        self.batches = self.items = 0
+        self._thread = threading.Thread(target=self._run, name="inference-worker", daemon=True)
+        self._thread.start()
+
+    @property
+    def alive(self) -> bool:
+        return self._thread.is_alive() and not self._stopping
+
+    def submit(self, pil, block: bool = False, timeout: float | None = None) -> Future:
+        if self._stopping:
+            raise RuntimeError("추론 워커가 종료되었습니다")
+        fut = Future()
+        self._q.put((pil, fut), block=block, timeout=timeout)
+        return fut
+
+    def stop(self):
+        """모델 교체 시 호출. 스레드를 끝내고 learner 참조를 놓음."""
+        self._stopping = True
+        self._q.put(self._STOP)
+
+    def join(self, timeout: float | None = None):
+        self._thread.join(timeout)
+
+    def qsize(self) -> int:
+        return self._q.qsize()
+
+    def _collect(self):
+        batch = []
+        item = self._q.get()
+        deadline = time.monotonic() + self.max_wait
+        while item is not self._STOP:
+            batch.append(item)
+            if len(batch) >= self.max_batch:
+                return batch
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait()
+            except queue.Empty:
+                return batch
+        self._stopping = True
+        return batch
+
+    def _predict(self, batch):
+        with self.lock, self._stage.time(stage="predict"):
+            return predict_batch(self.learner, [pil for pil, _ in batch])
+
+    def _serve(self, batch):
+        try:
+            results = list(zip(batch, self._predict(batch), strict=True))
+        except Exception:
+            # 다른 세션의 요청까지 실패시키지 않도록 하나씩 다시 돌려 실패한 것만 예외 처리
+            results = []
+            for item in batch:
+                try:
+                    results.append((item, self._predict([item])[0]))
+                except Exception as e:
+                    self._errors.inc(stage="predict")
+                    item[1].set_exception(e)
+        self.batches += 1
+        self.items += len(batch)
+        for (_, fut), pr in results:
+            idx = int(pr.argmax())
+            fut.set_result((self.labels[idx], idx, pr))
+
+    def _run(self):
+        while not self._stopping:
+            # 타임아웃으로 취소된 요청은 건너뜀
+            batch = [(pil, fut) for pil, fut in self._collect() if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                self._serve(batch)
+            except Exception as e:
+                # 예상 밖의 오류에도 스레드는 살려 두고, 아직 답하지 못한 요청만 실패 처리
+                self._errors.inc(stage="worker")
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+        # 종료: 남은 요청은 실패 처리하고 learner 를 해제
+        while True:
+            try:
+                item = self._q.get_nowait()
+            except queue.Empty:
+                break
+            if item is not self._STOP and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(RuntimeError("추론 워커가 종료되었습니다"))
+        self.learner = None
@@ -0,0 +1,198 @@
+# metrics.py
+# 프로세스 전역 경량 메트릭 (카운터 / 히스토그램 / 콜백 게이지) + Prometheus 텍스트 출력.
+# 모듈은 프로세스당 한 번만 import 되므로 Streamlit rerun 사이에도 값이 유지됨.
+# 기록 비용은 perf_counter 두 번 + 락 한 번 정도라 상시로 켜 둬도 됨.
+import os, time, bisect, threading
+from contextlib import contextmanager
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (64e3, 256e3, 1e6, 4e6, 16e6, 64e6)
+
+def _key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+def _fmt_labels(key: tuple, extra: tuple = ()) -> str:
+    items = key + extra
+    if not items:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help, self.kind = name, help, "counter"
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels):
+        k = _key(labels)
+        with self._lock:
+            self._values[k] = self._values.get(k, 0) + value
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, k, v) for k, v in self._values.items()]
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=SECONDS_BUCKETS):
+        self.name, self.help, self.kind = name, help, "histogram"
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}  # key → [버킷별 개수..., 합, 개수]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        k = _key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(k)
+            if s is None:
+                s = self._series[k] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def samples(self):
+        out = []
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for k, s in series.items():
+            acc = 0
+            for le, c in zip(self.buckets + (float("inf"),), s[:-2]):
+                acc += c
+                out.append((self.name + "_bucket", k + (("le", "+Inf" if le == float("inf") else repr(le)),), acc))
+            out.append((self.name + "_sum", k, s[-2]))
+            out.append((self.name + "_count", k, s[-1]))
+        return out
+
+    def quantile(self, q: float, **labels) -> float | None:
+        """버킷 상한으로 근사한 분위수 (관리 패널용)."""
+        with self._lock:
+            s = self._series.get(_key(labels))
+            if not s or not s[-1]:
+                return None
+            target, acc = q * s[-1], 0
+            for le, c in zip(self.buckets + (float("inf"),), s[:-2]):
+                acc += c
+                if acc >= target:
+                    return le
+        return None
+
+    def series(self) -> dict[tuple, tuple[int, float]]:
+        with self._lock:
+            return {k: (s[-1], s[-2]) for k, s in self._series.items()}
+
+class GaugeFn:
+    """렌더링 시점에 콜백으로 값을 읽는 게이지. fn() 은 숫자 또는 {라벨 dict 튜플: 값}."""
+
+    def __init__(self, name: str, help: str, fn, kind: str = "gauge"):
+        self.name, self.help, self.kind, self.fn = name, help, kind, fn
+
+    def samples(self):
+        try:
+            v = self.fn()
+        except Exception:
+            return []
+        if isinstance(v, dict):
+            return [(self.name, k, x) for k, x in v.items()]
+        return [(self.name, (), v)]
+
+class Registry:
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self._metrics: dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, *args, **kwargs):
+        name = self.prefix + name
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = cls(name, *args, **kwargs)
+            return m
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._get(Counter, name, help)
+
+    def histogram(self, name: str, help: str, buckets=SECONDS_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets)
+
+    def gauge_fn(self, name: str, help: str, fn, kind: str = "gauge") -> GaugeFn:
+        # rerun 마다 최신 객체를 가리키도록 콜백은 교체
+        g = self._get(GaugeFn, name, help, fn, kind)
+        g.fn = fn
+        return g
+
+    def render(self) -> str:
+        """Prometheus 텍스트 포맷 (0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for m in metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            for name, key, value in m.samples():
+                lines.append(f"{name}{_fmt_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry(prefix="ai3_")
+
+# ======================
+# 내보내기: 파일(주기적 원자적 덮어쓰기) / HTTP(/metrics)
+# ======================
+_exporters: set = set()
+_exporters_lock = threading.Lock()
+
+def _start_once(key, target, *args):
+    with _exporters_lock:
+        if key in _exporters:
+            return False
+        _exporters.add(key)
+    threading.Thread(target=target, args=args, name=f"metrics-{key[0]}", daemon=True).start()
+    return True
+
+def _file_loop(path: str, interval: float, registry: Registry):
+    while True:
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as fp:
+                fp.write(registry.render())
+            os.replace(tmp, path)  # node_exporter textfile collector 가 반쯤 쓴 파일을 읽지 않도록
+        except OSError:
+            pass
+        time.sleep(interval)
+
+def start_file_exporter(path: str, interval: float = 15.0, registry: Registry = REGISTRY) -> bool:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return _start_once(("file", path), _file_loop, path, interval, registry)
+
+def _http_serve(host: str, port: int, registry: Registry):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer((host, port), Handler).serve_forever()
+
+def start_http_exporter(port: int, host: str = "127.0.0.1", registry: Registry = REGISTRY) -> bool:
+    """인증이 없으므로 기본은 로컬에서만 접근 가능. 외부 수집기는 host 를 명시해 열 것."""
+    return _start_once(("http", host, port), _http_serve, host, port, registry)
@@ -1,11 +1,17 @@
 # streamlit_py
-import os, re
+import os, time, json, hmac, hashlib, threading, zipfile, zlib, queue
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from functools import wraps
 from io import BytesIO
 import numpy as np
 import streamlit as st
-from PIL import Image, ImageOps
-from fastai.vision.all import *
-import gdown
+from PIL import Image
+from image_pipeline import model_input_size, load_pil_from_bytes, make_preview, render_prob_bars
+from metrics import REGISTRY, BYTES_BUCKETS, start_file_exporter, start_http_exporter
+from inference import PredictionCache, InferenceWorker, bytes_digest
+# fastai / torch / gdown 은 무거워서 실제로 필요할 때 함수 안에서 import
 
 # ======================
 # 페이지/스타일
@@ -46,204 +52,727 @@ if "last_prediction" not in st.session_state:
 # 모델 로드
 # ======================
 FILE_ID = st.secrets.get("GDRIVE_FILE_ID", "1aMWEa_KXv3LXmqECcxkKDubfiVGv4ZnJ")
-MODEL_PATH = st.secrets.get("MODEL_PATH", "model.pkl")
+# 모델 캐시: MODEL_CACHE_DIR/<MODEL_VERSION>/model.pkl (MODEL_PATH 를 주면 그 경로를 그대로 사용)
+MODEL_VERSION = st.secrets.get("MODEL_VERSION", FILE_ID)
+MODEL_CACHE_DIR = st.secrets.get("MODEL_CACHE_DIR", ".model_cache")
+MODEL_PATH = st.secrets.get("MODEL_PATH", os.path.join(MODEL_CACHE_DIR, MODEL_VERSION, "model.pkl"))
+MODEL_SHA256 = st.secrets.get("MODEL_SHA256", "")  # 비우면 다운로드 무결성(zip 구조)만 확인
+# "fastai"(기본) 또는 "torchscript" — 후자는 torchscript_backend.py 로 내보낸 모델 사용
+INFER_BACKEND = st.secrets.get("INFER_BACKEND", "fastai")
+TS_MODEL_PATH = st.secrets.get("TS_MODEL_PATH", "model.ts")
+INFER_NUM_THREADS = int(st.secrets.get("INFER_NUM_THREADS", 0))
 
+# ======================
+# 계측 — 값은 metrics.REGISTRY(프로세스 전역)에 쌓이고
+# METRICS_FILE(Prometheus textfile) / METRICS_PORT(/metrics) / 사이드바 패널로 노출
+# ======================
+METRICS_FILE = st.secrets.get("METRICS_FILE", "")
+METRICS_PORT = int(st.secrets.get("METRICS_PORT", 0))
+METRICS_HOST = st.secrets.get("METRICS_HOST", "127.0.0.1")  # /metrics 는 인증이 없으므로 기본은 로컬 전용
+SHOW_METRICS_PANEL = bool(st.secrets.get("SHOW_METRICS_PANEL", False))
+ADMIN_TOKEN = st.secrets.get("ADMIN_TOKEN", "")  # 패널은 ?admin=<토큰> 으로 연 경우에만 (비우면 꺼짐)
+
+STARTUP_SECONDS = REGISTRY.histogram("startup_seconds", "Cold start phase duration")
+STAGE_SECONDS = REGISTRY.histogram("stage_seconds", "Per-stage latency (model_load, decode, predict, render_*)")
+DECODE_SECONDS = REGISTRY.histogram("decode_seconds", "Decode latency by upload size class")
+REQUEST_SECONDS = REGISTRY.histogram("request_seconds", "Submit-to-result latency by predicted label")
+INPUT_BYTES = REGISTRY.histogram("input_bytes", "Uploaded image size", BYTES_BUCKETS)
+MODEL_LOADS = REGISTRY.counter("model_loads_total", "Model loads by backend")
+PREDICTIONS = REGISTRY.counter("predictions_total", "Model predictions by label")
+ERRORS = REGISTRY.counter("errors_total", "Errors by stage")
+
+if METRICS_FILE: start_file_exporter(METRICS_FILE)
+if METRICS_PORT: start_http_exporter(METRICS_PORT, METRICS_HOST)
+
+def timed(stage: str):
+    """함수 전체를 stage_seconds{stage} 로 측정하는 데코레이터."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with STAGE_SECONDS.time(stage=stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def is_admin() -> bool:
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(str(st.query_params.get("admin", "")), str(ADMIN_TOKEN))
+
+def size_class(n_bytes: int) -> str:
+    for limit, name in ((256_000, "<256KB"), (1_000_000, "<1MB"), (4_000_000, "<4MB"), (16_000_000, "<16MB")):
+        if n_bytes < limit:
+            return name
+    return ">=16MB"
+
+# ======================
+# 콜드 스타트 단계별 시간 (프로세스당 한 번 기록)
+# ======================
 @st.cache_resource
-def load_model_from_drive(file_id: str, output_path: str):
-    if not os.path.exists(output_path):
-        url = f"https://drive.google.com/uc?id={file_id}"
-        gdown.download(url, output_path, quiet=False)
-    return load_learner(output_path, cpu=True)
+def get_startup_timings() -> dict:
+    return {}
+
+STARTUP = get_startup_timings()
+
+@contextmanager
+def startup_phase(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP[name] = (time.perf_counter() - t0) * 1000
+        STARTUP_SECONDS.observe(STARTUP[name] / 1000, phase=name)
+        print(f"[startup] {name}: {STARTUP[name]:.1f} ms", flush=True)
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def verify_model_file(path: str, expected_sha: str) -> bool:
+    """사이드카(<path>.meta.json)의 크기/수정시각이 그대로면 해시 재계산 생략."""
+    if not os.path.exists(path):
+        return False
+    st_ = os.stat(path)
+    meta_path = path + ".meta.json"
+    try:
+        with open(meta_path, encoding="utf-8") as fp:
+            meta = json.load(fp)
+        if meta["size"] == st_.st_size and meta["mtime_ns"] == st_.st_mtime_ns:
+            return not expected_sha or meta["sha256"] == expected_sha
+    except (OSError, ValueError, KeyError):
+        pass
+    digest = file_sha256(path)
+    if expected_sha and digest != expected_sha:
+        return False
+    if not expected_sha and not zipfile.is_zipfile(path):  # torch.save 결과는 zip — 잘린 파일 감지
+        return False
+    try:
+        with open(meta_path, "w", encoding="utf-8") as fp:
+            json.dump({"sha256": digest, "size": st_.st_size, "mtime_ns": st_.st_mtime_ns}, fp)
+    except OSError:
+        pass  # 읽기 전용 위치(MODEL_PATH) — 검증은 끝났고 다음 기동 때 해시를 다시 계산할 뿐
+    return True
+
+def ensure_local_model(file_id: str, path: str, expected_sha: str) -> str:
+    """검증된 로컬 사본이 없으면 임시 파일로 받아 검증 후 원자적으로 rename."""
+    if verify_model_file(path, expected_sha):
+        return path
+    import gdown
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.part-{os.getpid()}"
+    try:
+        gdown.download(f"https://drive.google.com/uc?id={file_id}", tmp, quiet=False)
+        if not verify_model_file(tmp, expected_sha):
+            raise RuntimeError(f"다운로드한 모델의 체크섬/구조 검증 실패: {file_id}")
+        if os.path.exists(tmp + ".meta.json"):
+            os.replace(tmp + ".meta.json", path + ".meta.json")
+        os.replace(tmp, path)
+        # rename 으로 mtime 은 그대로라 사이드카도 유효
+    finally:
+        for leftover in (tmp, tmp + ".meta.json"):
+            if os.path.exists(leftover): os.remove(leftover)
+    return path
+
+def model_fingerprint(file_id: str, path: str) -> str:
+    """모델 파일이 바뀌면(경로/ID/크기/수정시각) 달라지는 지문."""
+    st_ = os.stat(path)
+    raw = f"{file_id}|{os.path.abspath(path)}|{st_.st_size}|{st_.st_mtime_ns}"
+    return hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+# model_fp 가 캐시 키 → 파일을 덮어쓰면 다시 검증·로드. max_entries=1 로 이전 모델은 해제
+@st.cache_resource(max_entries=1)
+def load_model_from_drive(file_id: str, output_path: str, expected_sha: str = "", model_fp: str = ""):
+    with startup_phase("download/verify"):
+        ensure_local_model(file_id, output_path, expected_sha)
+    with startup_phase("import fastai"):
+        from fastai.learner import load_learner
+    with startup_phase("load model"), STAGE_SECONDS.time(stage="model_load"):
+        MODEL_LOADS.inc(backend="fastai")
+        return load_learner(output_path, cpu=True)
+
+@st.cache_resource(max_entries=1)
+def load_torchscript_model(path: str, num_threads: int, model_fp: str = ""):
+    with startup_phase("import torch"):
+        from torchscript_backend import TorchScriptClassifier
+    with startup_phase("load model"), STAGE_SECONDS.time(stage="model_load"):
+        MODEL_LOADS.inc(backend="torchscript")
+        return TorchScriptClassifier(path, num_threads or None)
 
 with st.spinner("🤖 모델 로드 중..."):
-    learner = load_model_from_drive(FILE_ID, MODEL_PATH)
-st.success("✅ 모델 로드 완료")
+    if INFER_BACKEND == "torchscript":
+        if not os.path.exists(TS_MODEL_PATH):
+            st.error(f"`{TS_MODEL_PATH}` 가 없습니다. `python torchscript_backend.py {MODEL_PATH} --out {TS_MODEL_PATH}` 로 먼저 내보내세요.")
+            st.stop()
+        ACTIVE_MODEL_PATH = TS_MODEL_PATH
+        MODEL_FP = model_fingerprint(FILE_ID, ACTIVE_MODEL_PATH)
+        learner = load_torchscript_model(TS_MODEL_PATH, INFER_NUM_THREADS, MODEL_FP)
+    else:
+        ACTIVE_MODEL_PATH = MODEL_PATH
+        if not os.path.exists(MODEL_PATH):  # 첫 실행: 지문을 만들 파일부터 받음
+            with startup_phase("download/verify"):
+                ensure_local_model(FILE_ID, MODEL_PATH, MODEL_SHA256)
+        MODEL_FP = model_fingerprint(FILE_ID, ACTIVE_MODEL_PATH)
+        learner = load_model_from_drive(FILE_ID, MODEL_PATH, MODEL_SHA256, MODEL_FP)
+        if INFER_NUM_THREADS:
+            import torch
+            torch.set_num_threads(INFER_NUM_THREADS)
+st.success(f"✅ 모델 로드 완료 ({INFER_BACKEND})")
+
+# ======================
+# 예측 캐시 (세션 간 공유 LRU)
+# 키 = 업로드 바이트 다이제스트 + 모델 지문 → 같은 이미지는 다시 추론하지 않음
+# ======================
+PRED_CACHE_MAX_ENTRIES = int(st.secrets.get("PRED_CACHE_MAX_ENTRIES", 512))
+PRED_CACHE_MAX_BYTES = int(st.secrets.get("PRED_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+PRED_CACHE_TTL = float(st.secrets.get("PRED_CACHE_TTL", 3600))
+
+@st.cache_resource
+def get_prediction_cache(max_entries: int, max_bytes: int, ttl: float) -> PredictionCache:
+    return PredictionCache(max_entries, max_bytes, ttl)
+
+pred_cache = get_prediction_cache(PRED_CACHE_MAX_ENTRIES, PRED_CACHE_MAX_BYTES, PRED_CACHE_TTL)
+pred_cache.bind_model(MODEL_FP)
 
 labels = [str(x) for x in learner.dls.vocab]
 st.write(f"**분류 가능한 항목:** `{', '.join(labels)}`")
 st.markdown("---")
 
 # ======================
-# 라벨 이름 매핑: 여기를 채우세요!
+# 라벨별 콘텐츠: content/content.src.json 을 고친 뒤 `python build_content.py` 로 manifest 갱신
 # 각 라벨당 최대 3개씩 표시됩니다.
 # ======================
-CONTENT_BY_LABEL: dict[str, dict[str, list[str]]] = {
-    # 예)
-    # "짬뽕": {
-    #   "texts": ["짬뽕의 특징과 유래", "국물 맛 포인트", "지역별 스타일 차이"],
-    #   "images": ["https://.../jjampong1.jpg", "https://.../jjampong2.jpg"],
-    #   "videos": ["https://youtu.be/XXXXXXXXXXX"]
-    # },
+CONTENT_MANIFEST = st.secrets.get("CONTENT_MANIFEST", os.path.join("content", "manifest.json"))
+
+@st.cache_data
+def load_content_manifest(path: str, mtime_ns: int, labels: tuple[str, ...]) -> dict:
+    """manifest 를 라벨 이름 → {texts, images, videos} 로. 파일이 바뀌면(mtime) 다시 읽음."""
+    with open(path, encoding="utf-8") as fp:
+        manifest = json.load(fp)
+    out = {}
+    for entry in manifest.get("labels", []):
+        label = entry.get("label")
+        if label is None and 0 <= entry.get("index", -1) < len(labels):
+            label = labels[entry["index"]]
+        if label is not None:
+            out[label] = {k: entry.get(k, []) for k in ("texts", "images", "videos")}
+    return out
 
-    labels[0]:{"texts":["아일릿은 인기가 많은 신인 아이돌이야"],
-               "videos":["https://youtu.be/SvAtijkbp4w?si=slRe4jtIGPLL1xnV"]},
-    labels[1]:{"texts":["에스파는 가장 남자들한테 인기가 많은 그룹이야"],
-               "videos":["https://youtu.be/JvABRVxCoJU?si=HF1vL47-KRt4WRXD"]},
-    labels[2]:{"texts":["하츠투하츠는 최근 유입된 팬이 많아"],
-               "videos":["https://youtu.be/FGBwQeD2FpY?si=g8iMbVCQh_gM5WfI"],
-               "images":["data:image/jpeg;base64,/9j/4AAQSkZJRgABAQAAAQABAAD/2wCEAAkGBxMTEhUSExMWFhUXFxgXGBcXGBkYGBgXGBcdGRgYGBgaHSggGB0lHxcXITEhJSorLi4uFyEzODMtNygtLisBCgoKDg0OGhAQGy8lICYrLS0vLS4tLS8tLS0tLS0tLS0tLS0tLy0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLS0tLf/AABEIALcBEwMBIgACEQEDEQH/xAAbAAABBQEBAAAAAAAAAAAAAAAGAgMEBQcAAf/EAEAQAAECAwUGAwUHAwMEAwAAAAECEQADIQQFEjFBBlFhcYGREyKhMrHB0fAHI0JSYnKSFOHxFTPCU4KisiRj0v/EABkBAAMBAQEAAAAAAAAAAAAAAAECAwAEBf/EACoRAAICAgIBBAICAgMBAAAAAAABAhEDIRIxQRMiMlEEYXGBI/BC0eEU/9oADAMBAAIRAxEAPwABSkcYe8MH8I98MJCt3rEhAO4xzs9GNCTLUMi/DLsRCkTAaFwdyvqsPJB/KYWqXioUHsIW/sfj9HJSdwhTp1P10hCZa0+ziI/Kr4GHpc9LspKgdxA9N8K0Mn4ehtkf4iJOs+qQRFybMg/hP8YSuxgCmP65iAp0GWPktlApSsiO2cE2xBxqnyf+pIWG4tSKeehWqerP6xfbCISJonKXhCSQAQ5Lj0EW5as5nBp0DsuzFZwpdzBP/oYsqErnWhKCpOHwzmUtuBrWuUEcmRZpBK5MhcxehNB6/KBe85YtEwqnqUhZ/MzDcEvRhC+oh/Td/X8kYJxrmFBxSwglIdwVNk2lXghu+7JKLKmakDEwVjo5U1eIrSKyRcctKGTM50z9Y5F1AAJTOWGLhiCH5GJympdMssbW6JF03rhQtJzxU+XpCbzspnhOJ2zJyAoczyMUds2dmBymaFa5se1YZs1snyzgUolGqTXKrAdGiz920yKbjqSLu55s0rU484RKCW1SlVFVG4ekGarUvA65pAZyUs3cCA+7LXNVNM0yVI8iUgNmQdMTaH0i2lTZ/mASkA73UR0DD1hWg6a/8K6YJZJKApdcxV+pYQ0bKs5IA5lz2Hziwst0qfEsl6+YMg8GCfi8Sf6eYnIiYNyvKr+Qoe0TaKqb8lL/AKWTmroAB73MJVciNxHX50i8E8CigUfuoP5CkOmSDq/KsC2je1g4bvUnJlDcfKfSnoIQUge0kp5in8g4gn/pOBjz+k+s412HXhg6LIDlXlDa7Dyi+mXSjNmO8HCfTPrDJu9aclBQ3KDH+Q+UHYOS8g+qxCEGwHdF6tTe2hSeLYk/yGXVo9lywqqajgXEG2H2sHl2LhDKrHBOqy8IZVZeEHkBxTBlVjhpVm4QTrsnCGF2PhBUxHjQNmzQ2bPBGqy8IbVY+ENzEeIHjJjovf6LlHQeYPSK1CIkIRHiE8IelpMSbLJC0Ih9KI8QiHMsyBzMKUFol8IWuzhQZQBHH6pCEzgcnV+0EjvlD0vGckAfuPwS8CmDkhhNlWj/AG1OPyqr2VpEmz21L4VuhW5WR5HIw6izrOa2/akD1Lw4LvQfadX7iT6ZekH+Rdr4izOlihUH3O57ZxLsE7zDChTPm2Ef+TRBl3YqXWSqn5FZdDmIsLvtgxBK0mWrcag8lChjcQOb8ktVqmuQMKQ/FR7U98LtNlExLLrv0eFFFYfSikNQjaRUi7MNZZw/pPmT61EJ8E5zEBDfiT5k/MRbKHGFS2hXSCmUtpuTxShXiAywXKQM91R17xZSruQkUHYAe6Hl2UGo8p3j4jIwytc5GY8RO9NFfxOfSKN/RO/sfloAyA6198SAQcw3L5RGslolroDXUGih0MTAIC5AbQwqQTlX63Q34JiS0OBR1rB4J9h5tEH+n3xHN1pd0Og/pLDqnI9ot8AOrc/nCVSmjKFdA9S+yrKJqcwJg4eVXY0PcR6i0IJYuk7ljCemh6RZNCZkoEMQCNxDwaNyI/hwhUqONgb2FKRw9pP8Tl0aOE2Yn2kYxvRn1SfgTAoPIQZTxHnXYlVcLHeHB7iJ0m1oUWBAP5TRXY1h3A8ajcimVYZifZW43LFf5J+IMNO3ty1DiPMn0qOoi+8GE+EI1BUioly0LDpUCOFe8eLsgixn2FCqqAB/Nkf5CsVq1BP+3MMz9OHxB/IM3UmNxN6n2Mqs/CG12R4kzJ05h9yE7y+Nv+1LE9IZlWUTPanFW9KfJ6DzdzG4jLJZHNj4j0joni5pP/TT1AJjo1IPNgUhSjkg9ae+vpD6JKzqlPc/KHpaYflphLHUftjSLJvWo9W/9WiRJsSRXCObV7msOyxD6RGsPFHIljnDyUcI5LQ4kE5QvJDULSmHEEcI9RIJzHvPvh5EgRt+EK2jgR/iJEiWDmO4jkS2iTLEOovySlJeCovBrMlU3xMKB+A+YEnROoJgYmbdrLlMpIDjNRPuaHPtJtZKpcoZAFZG8mg9x7wIyLuWpBUBT6+cWjji17jmlkldRNM2a2gRafLhwTBVs3G8H4QQAARmNxpEqUqcD96k0HClW6tGgWG90qSlSklGIAgn2S/HQ8DAlBR6GU3WyxSrhHpj1NawH7b7Sqk/cSSy286hmkHJI3E5voPTJNmckgpm2dKqKAfJ9e+cITZ5iB5FYxuWa8gr5xj1ltczzzMasQGbl6nf3g82Fviav7uYStP4VGpBzYnUUMM4UKp2Eku8EuywZav1ZHkrIxMFcmhS5QUGUARuMRDduGspZR+n2k9jl0haNZLCIWmkQf6xaKTUED86Kp66iOvC80okqmJILCn7jQPGNd6EXpf0iQQmYfMdE1LbyNITYL7kTi0uY50BBS/CusZ1NsM6etRDqJLkkwQbL3J5yJlMNW6+ohuxuNBv4e+PMIhcuaGpUClYVQ8PURnES2Rp1mSoMpIPMP8A4iObGpPsTCP0q849ajvFgZZ5jhCQOELQbK2baJiB5pRVxQXHZsQ7GEyJi5uUxCd4TVQ5lWX8YtAOMRLxTJCSubhAT+Ilm6isajWM/wCloNVkrP6ji7A0HQRI8EAMBAhaNt5UtTSzMmJ/UA3QkhXeLuw3oq0h5a5ad4HmWOYoB1eM0ZSLRQAzYRV2u0yF0w+KR+VOIj/uHs9xEr/SUmqyVn9ZcfxFPSJiJSUhgAIA1lAETfwylto84v7z746CDpHRjGeJTD6ER6iVEiXxjl5O6Z6FKtCUIiRLkwpCRugbvjazAookhKmzUXIfhv5xSOPkSnlUFbCyXLA4w9LRx7QA2TbKaD5kIX3H9oNrovFM9AWnLIjUHcWijg49ko5Yz6LBKPow4mEgRFvq9E2aV4iqnJKRQqO7gN5jJAk67LBMPJEZVaNsbUtTJWEPkEpHvLmLfZ/baZiCJzKSaYgGUONKGKcGiPqJvRH+0CU9sQn8yEDutQi7u64ylGEggAumoJNBn5eEUP2iWhJny1oL/dio4KUR74vrrv1U2ShSB5xQ1ZiM2MN/xQcfza8kK2XT/TjxfKHJSWKslJOElya003wQ7GWgTLNhX5ilakl6vV/jA5tve2FCZDVJxKq7NQJdq5+kO/ZrbgVzkEirKD73b4xqYJSV0F67GUOqUrDrhNU/2jKC9ptBBNVrJJ0AdyeQEavtLPKLLOUDXApuZDfGM72Ju9M2cvESGRRixqYMVROraQVT9m7MJOEJApm+Z3vAxY7cZa5aBTAruQaOeUGtos2MeGFEAAsRmGLPABfwCLThBcgJc6v04NBstNJKzX0mPYrrutMxcpBSkVSnzKNMtwiT/SrPtTDyT5R3z9YQi2OTJyU+0QOZgT2ynywlGBLEkuWIBAHHOpgsk2NCahIfeanuawEfaDPeahA0T71f2gNDQeyVsyshOEoIeuIhnd250EPm3ffpADaHOoPRs21hyzW5Bky1Pmn1ZiODGE3lbUiWiod013sXPuhvB0Vou7uW7jgD6kfCJsUd3KWVDAz+Gg1yZ1RNvO+ZVnSDNUATkkVJ5DNuJgHPLsnpDQvFvD++B2TtnZCQMag+9Jb0eL2RPStIUghSTkQXBg9CsWEDf3jJ9qb3Xa55RLBMtJIQka6FZ5790aXtBMKLLOUDUS1N2gE2UsqpbKMsnHV82TpygqlsaKcnQMWm6Z0oY1oIGmRrplFhszbE2eZ4qlEKBIKRqDv+tIOb2MspKFajJiYytRZRbQwydmnFQao3YVDisImKw+0pKeZHxgMVec1SQFTFMwoKacG+MQpivo1+u0Qc0dcfxX5Ybm8ZP/WR3joAys7z9dY9gc/0U/8AlX2TZcuHwiPJaIkAcREKTWxrootqbcZUgge0vyg7gcz298CtzXJMtL4WSBmT7ouNv1EmUnTzd3EXux0lUtGBSCKOSRmTuI9xjpxLhDRxZF6mV30gRtFwLkzGmNhaitC316xe7OXpLlzUy0Oy1MebU9Whe3lqCpeENiSoHV2qNza74CrvtOGYhR0Wk9iIr8okpNY50jcBGcbcW0rtBRpLASOZAKj6gdI0ZCqZRk21sz/5U0vmvswb4esTx7Y+XURi47nXaZwQgs1So6AQUztjFSj4iVYmL4Wam6I2w89aFKUhBU4SKB2d6k4g0HF6GYpACSAoh6uN1KV1/vDyZscEkmZptaQpSCkMAkDN+R7CJGyF4BKFIOhfoYReKBLmzJM0jzJcEOyVGobVnEUd0v4oHN+lfhB7iLfHKmX21ksKSJg3j1+hFZs3blS5rp1B48QT1aLC3eIuSlASVKKXIArSpoOkM3Lck0YlKlkOAACGLFTEscqAxk0omcW8toK9oNoxMsJBI8RWFJAPGpbp6wM7GW4ptA3KSQfQ07R7fl3KlSwVpwFSinKtCS3QNXIvSK/Z2aE2iWSWGJu4b4iG24it1kRpVqmKluoLUtwWDD1LRmxtRVNUtWalVPWNTvJP3SyKnCW7Rj+JlHgYEEPnn0a5sklS7OlaVlKh5eBw0qItLTewkD/5DJBoFAuCeWcZ/sptGuWlUpAdCQVnLE2uF6RT31bptpmYnUpyyRmyXoPnArZN/ZoFr29syXwhayNwAB6kv6QHX5efjzDOZnAYO7ADfrFHOs60zCkgjSo6RZypQRJmiZTLD+5wabnD/QjcbDF1YWbI1kn9x46xUbTTmnAOT5feYiXTtFLkygnF5quGO/lFdeN6JnLxJdwMzw3CNTKOa49hzYL5RKWVKLBFmB5sosBxMZ9b7zmT5qpiy5Uew0SOAiJbLSqYrsO2UW2y1k++SpYolyXbTLPj7oNUtkr5y0cm454QF4Dy4QXbGWxUoJSs0WoJA1BJIr1aL2TaELl4k1G+h7NARe88eKFy6DOhHtA505ekKX4JIPtqrUgWadLHmWUKDCrU13RR3PeKTZ5QxAEgDnhowgVk29S1tMUSK5mjwQ3VZkpT4eFJGdas8CT8DY1FbRMv0ShJ8SaPMkPxfRj1jO7osap04JAJcuWBNBnlBTtNZJigAmoGQyAOlOHygg2JuyTKxGWrEpgkv7Wdabjw3QU9CZPlfhFVOsi0+0hQG8giIpQY0hbAEkgDV90Al9zZappMseX0J1IGkRlCjtwZ3kdUQG4+/wCUdCY6EOgtpYiVLTEdE3hHs+0YUlSiwAcwiOdgjtnaQLTL1wAFurt6QaLtiFISQtIxJccXFDGUXpbTMmqXvPpoILNhbepYVIUApIDpcVD5jlHW4NRRxY8qeR/sv9qTL/pVYgCcDON7aRlBzjVr7u7HKUH0LbhGY26xTJZ86SNxIYHlvhsTE/KXTRr1hvdBs8uYpSU4kAs9XaoaMnvO0GZMUs5qUT6wXbN3jJFmCWAmBKgXTmQ+Sm3aAwELJcxPC/c1XRs18U/s0n7NLUjw1S6CYC5GpGhHu/zBabSkrwEE6u2XU/CMc2ZtRRPQXarPzjSr2tcxUghCmJGFxnWhY8oeWmPjfKNmf7XW5M61TVJ9keVJ34QxPUvFZdamW/CG5gAJEJQWGX0Yo1qjm5e6w/2LnMqYfxE4U9Wb4doLbwlYEpKWK31YqXqQl9aP0gA2GtjzlA6soeo+AjSLbJxhJYEpOIPvA+RMCCOhytJoy3bWbMVMSVlx5sJYh2YGh6Gm/hFFd0rHNQl2dQrurUwRbcE+InEXIxUBdq/FiesVezpwzgoNiTUOSHLigbVvjDeDnkrma7ZgTJwqH4SFEa5aJS6mybi1c4x7aOwCTaJkvECAaHga13GuUbQJ6QSrF5SlwNxZyMndgT0prGJ37MxTlE560arVpzeCGfVkSQsgljoQeRjUPs/u2X4QmFitRLAs4ALCnrGXyI1rY+Q9mlTQtVEkYX8rgsadPUwsg4SxvmwSle0BiFRRyONIyvaK3rUoy1BsKiKc9d7VbnGuWmxCa7qUnCcgSO+/+0Zft7ZAi0kj8SQeoofdAT2UyfEF1K0jpao5QiTYrHMmFkIUrkCYp4OWm2JUNfp84Otg1JmLmFQHsppnxJ6kwFWuStBwLFRmN2unODTYaQQFqJZRZuIaJz6OjCnyC61SwkYUgAU61gS2tUlK5aEsM1EBuAB/9oJLXLSxUXcVoYAb3UpU1SycQKQr9o/K3CJ9nRN0iCZ7k84trtvqajcoDfnA9hrQvu0b6rFpZZJOBsXmHm8hISQWOVSMtNYtSZyxk09Fjb77mL3J5f3iNYbyVLViBIOhBLwymxzFBRCVliwGFgWooua03M8LmJRKZSlhNMOBJKip3dRJYsQ40zFY3EPJvsK0XxNtMts8IxKKciB+YgllD8u6sQVD6+qxT3Tb5q5gRL+7SwDJoACWcnNtIurUgpWpJzB0iOWKWzv/ABMlxaGi30BHRwTHRE6x1N6pNJaVzP2inc0iBtzayiVLRkVhz6OPWCBCWHygW27QSJajkCpPdjGw1yODPyUG7A0xoH2aWNKkTFKGoY7mGh0zMZ+I077Na2dQGeI+6OxnDi7C0WFGZD8yT74cXZ0t5gG4wsIJbl8oqtsLz/p7MtY9oslPM/LPpGSoq5fYHbZX3KSoy5YClihb2UkHXeRu+UA65jurWETC5JNTCUZxlFIhLI5PZIlr8wbONK2ctwmy1S1UWBVJocsxvEZlJLERoVxrk2uWJb+HaJafKoe0G1B/EK1B3xOZbDKrBSbd4KJ6vxS1J6pJIPqBFdKQ7B84OdproFlsqih1KmKQmYs5kCopkA9OsBEulYZO9iuNNIfuq0qkzQociPrjGpWDaIKDFNWBoYy20nJfI8vr4QW3VMcA/p+JgOVK0UxR3xZVbYWzGrDriNNw0Y6xF2TQk2iXjUUjNxm6atwoD1aPdo5JUfETUChIrXXtTuIVs3ZRNmoDFkkYmDmtKDnDRdonNf5DW5qsKDNUQGBZq8gQ2ZDvqHbfGSbXWAImeJLSRLX5kkkEEmpZsm3HcY1jARIKHAKgQAp2ClDypHLlGe7WWgy0CzkpWPbUU1ZILYXahJBrDGaTTAyXBz9nd6rSpdnzSoFaf0nXoaQE43DtBX9nMxP9UkK/ElQS+/d2eA9iQdM0ZK5iR5sLHdm8Z7trYFqUZz5YQRqAXY8nHrGqGyJ6QD7WT5alKs1nTimrZK1PQAF2zplXcHhOLTs6HNSTVFHdGzEmZIONYE8soAnJJqEs4DkNU74cs02ZKOApwMAW0IemHhE6y2ZLeE4Kk+UEhnowbfp3hG0ktKJcpT1SugycLcqoagBkh8i8K3yY8YqCtAhPneJaCogVUKHI8DBwi5WH3Zw5FiapP6TA5s7ZpZSqbNIDrDPnQvTXOnSDtCgQCMjDP6BhTS5fZAEqcUrSoklvLVNebEntANLSoTmB8yi3ChqByjR3gVvmU1ps4QAC55Zh/R4CDkV7F2/ZlEwOjyTN4yJ4j4iB2cm02ZRlqxJJzFKjIKB14GNIsyHIixvu40WiTgJwqFUr/KRv3pOo+UPBsnmiltGYzLBafKSopSsgB1ACg8podIjJs0qWEqWvE5ViSmuQp5jxh6fdq0qKZk1ISksSCVJB03cx0yeGZRUhzLSCCfaUC5LUPAagd3im2R/o9kTFzAlMsBKRQnIM5IxHfSCXD5Uq8QLxDESNHLsYHFLnTsKCzUDANqB2rllF/YLD4cirYsdRRw6d3/b6xPIlxo6fxW1MWD9NHQhuXeOjkPTJ068ZaPaWBwevbOBzbK8UzES0p/c+VGYd39Iu7Jd8pHspD78z3MDW0MszJuGWlwmhIyfnvgYa5HDn5cd/7/v8A3LjS/s+GBSk6LQFjmklKoA1XcrEECpLfRjQdkJRMqWsBXlSpJKSxqf7ab462+qOTFHbsOQIz/7V1nDJGjq7gD5mDuRMcD5v66wD/aon7qUf1kd0n5CHBNaZmZiYm7ZnhePgPh4sOLR/rWIT1jX5N6WSZd+DHKT9xWWCAUqCcmzd4zIwVsymzy3c7g/Ns/SLG47WqXaZSkKIdaAW1BUAQd4MVoXD13Fp0s6BaD2IhWOvBq+09l8SzrRwJHMVHq0ZOtQYevPf7o1+3KL4N6FH+LD/AJRkVrR5lDUE9W+MSxl8q1Y5OX92A7/LP0LwR7JTMSTyA6h4EJhYAQR7FKqtLs5FTxo8PJe0XFL/ACIRMvFSZmApBGIuDuOmbM31lDlntchMzxkImJYiiSCBQEEZEPQ1yaCu13HJWjxWxeVUxLMH/EluDNQ7oDtnpspClKnyxNRhHlSQMJOR30CSGfWCkad2abdV7pnS3QQ4CUtUVdVct3rSMmv60GZPmF38xGTA4aOwoHz5mNFuu9ZYss5UlCEKQnEUgEUw5kuXLvr84zCYXfeYcSXRGIpBNY7bZkyZaFeNLmoZYWkIUHNXAKgWypw5wPyZRUeADnl0ida5iPZKRiSkBwVPi1FSQWJbIZZ7wxY62Gcjam2zpeEKkoegmEpSsgZ4UlWfFm5RcXJdstCCEedanxrUUeZ86hRI5d4zKzICyEqUrckAA5nKpDVPrpE5EtCFoQkBYUR94UguHZTJUCEs3PixEAdM0yXcP5lltBm3Wn+AIcvu5haJKpaiCWJSTmC1GOYr3jLbxtJDKCmUSQrA6cmJAGQPmINNBxeEm8poqJswclqHxgozYqS4ISaEFiOINfWNFuqUUSkpUXIHvLtGaJmEkqJqS/Uxb2S85qWwrLbncdom+yuKVB+TA1tSg45CwWaYA+5yPSkNydpyGxIfkWhu2bQpUmsuoUhSXr7KgW9CIyZSbTiw5uqzEl90Vm0ttmzbKlEtwVzGLU8j5Hm6X6w5s9e61SJ01aQEpSog8Wyz5d4Ar9v1ePAksEAp1HtDzPDxf0SyNbsdXs8tCcagwCcVS2RqOdCYg2TaOamlCAGSGHlrnxLOntES13xNmJKVKcEgnOpSnC9eHuEV6TD99nO5JfEILRtCo0QkID0bQEVHesObOWha5yZRVRbJrvAOF9eHWB8RNuu0+HNQv8qkq7EGEa0PGb5J2F9oklCilQYihpHQq13kpayvJ9OjR0cp7KbrY7KnxfCxImS00wjNg3ygakzdYK7vJ8EHOj+sD8fto58/SKuVcYC1qCQ/spfUaknjTtFpd93+FKEsMW1Op3949s80FSh1bn/iJoVHWoo5m2e2eXhByzegaAr7Upn3Mof/AGH0T/eDYKjO/tTWxkp/ef8A1EMiWT4sASY7FCCY4wxyWPJXC0TIjJMOIMLQ3I2nxQsylDUKH8gFf8Yzq9JCUW4g+x4iSf2kgn3mDi7ykWeyqAA/28qVWgp/5QFbcJw2snLEhJ+HwiEFujsyP22Qb7u5UsBZDYlK8v5Q/l7srtEzZKRixOrCnVTs35dd5iPtBfCZxUGfLCd5C1EFtPKtQiTsVNQFrTMVhSpJDtkohgXajAnOKpPjsimvU0HVumBUqYUMQmXNYoZyoIKRlwBYxS/Z5dcqYicubLEyqQAocyWfXKCO5bTKnS/JkKHLShDO+R10MLlyESZWGzoCUrUASlyoTDTKugDD5wSklbI+1NhlWexTQhISSwOGmZyJzUBiOcZEVVjU/tFnKTZylRqpaQwyoH1zyjKhBIz8Euz2gpdgK6kORxESZiQmWHqtVXOiAaAcSz8mFNYDw74pIAOSaDkS7P37wGZD1kmAKBNPaD5s6SHYV1Hwh68bUCEpDUcnCSxJAGZAf2QerRXPHhMag3qh6ZOUr2lEniSffCCYbQqsevGFskJTQRd3bdUyYBQgak0ERbgU6m4Qc3b7MTfdHTiiuygvO5hKlFeIlQbkeQijsElU6alBolwVncNerRodplghiHyMU902Va5s37sgEhiaZKBbq0DopKF/wEe1k7wLCtUsANhAAoA6wB6kRjC1OY2rahImWGYnPy+6o9WjEjFkceSz2PYTHPBJjgMSrHLKlAcYhJMXlzy28x3e+Em6RXDHnJIuX+nEdDOLgO/946OU9mx6RaN0GtgfwUsoNhzZnfOAS70YlpS2ZaDoScElgSWTurQbobBHbZzZnpIG5F5FNvKCKKSQTlk6grjk3WDNKozC2TybaoYsIKSkkkZYH1yrWLG4dtwhIRPBLZLFXbeN8dKORSXTD8mMy+0+0PPlp3S37qP/AOYJ1bb2Rs1/xjO9rL1FonmYkEBgkPnT/JhkJlkuJSkx7CSY9gnKeiFphuFpMYJp3j4btkL1SZJ7TEiKj7SEjxJSt6VDsR8zE+ScVz8kK9Jp+UVW3FqQsyk4gVAElqs4Tn2jnj8v7Z2T+H9IEFqrBHsXZkTJiwtGNk0HViWerO/SB+YkRf7HWky5zgE+UuzvozNvVhHWLPo58fy2E9yXOpKwU4gUrUlbpYUdpiNA4DEV9rrF7ZbzmISRJTiUpa1YClikAthZ0hITRyTmpoqbqUszZi5iihKFHCKJQwokAnz4SUuUjOgrFtZtoEIUMUrClRIMwAMo/jo4IGJi9XEA6H0Ce3FomENMZLrpLBfAyADlSpL9YDDBFtlNlmeoSy4xKc4sVXbPpA6qMiU+z14UkwiFJjCo4GElUeRxjAPEGsLeG9YWIJkW9zOCTwgwuy0KwwI3UrThBPdasuES8nXj6LuqlEcPdX4Q/di2NTwhiyq+8FevSH7NI8TExZWYHEQ6RRsm3nZyZKyKpUDTdqekYeqNtsa14JiVhhhPHTSMYvOVhmzE7lqHqYZdnLmWkdNsaky0TT7KyQCK1Gh0B4ZxHiyReg/pVWciuMKSW7uSaZaCK1MYi0vAtKCGjQ9ltlDMkeJMWUKWXQKEYWoSOPOKbZLZ1U1YmzUtKToR7Z3DhvPTlowmUYUApSg5f2iU5ro6cONr3IF5myVoBIAQRvxZx7BSJqvzHvHQlwOnnP8AQFbL2fEsqIyavODJYThqHprGf3fbDKXjDHSu7hxgonXpK8MrMweyVAOK0f4QcTVAyIza97RjtMxQyKyBydvdFcVR4tRJc5w2uLo85uxbwys1h2G1IgoViGhy0SsKlJ3EjsYstmrsM+elAanmIJZwPoQraWyhNomB05ucJcAkVEazcHxspzCkmFYYlWG65s0KMtOIJzqkGvAlz0ggSYc7IK8awTJJ0K0dFDEPVRjPxnWNA2HlKky5gm4U+YKDrQTkxJYlshnA3ilSJiygCaagKWHSH/KA1eL/AN5R+TOiauEWUhEXOyQP9QA5SCCCQWo410yFRWIPigzcRCWcFgkANuAFItLBPx2gMGDKYAN1bfDSdC4427/YZSrAoK8uAlycZBWt8nCi5B4hmblF2lSpaQF+dOqQmuFsNKnFxSXJz4RmKbdNleVC1JcMQD8NDBfct5zChIWcX7qvz3wHKKOmK5ugY2slJQqWlKQnyksCTQqo5PUdI92V2YVaxMU+FKQQCcvEZwOW/nHu2XizJ+My1BOEBJYsQNx5kw5cN4zbKhKkOMSyVJP4gKMRGtEWvcyit9gXKWUTElKhmD7xvHGI7RtVuu2RbJKSoBQIdK0+0H3H4GMktt3kT1yEeYiYqWnQqIVhHAPBFcStjoJrNsPbFB8CU/uWn4PFpYvs6mEjxZqU8EgqPcsIIOLAiTIUsskEkAqLbkhyewhAjYru2bk2Z0oS5UkhSjVRenIchGR2yTgmKR+VRHYtGNKNbJ90FyTwgnupXlJgdutPkLch8YILv/2zzHxiT7OjGW1mmgMTWoiau0+FNLc+4yiklKiZfK2mg70j3ZwU9FAjsk8qRMUA/lLdq/GMl2xktbJrDMhX8kgn1JjTrgtYwKGdCewqPrfAPt1KCbQFDJctJ6h0kf8AiIe/JDIgTMgwdbNbGjCmbPDlwoIBGHCzjHSvIQLXZJ8SdLR+ZQB5PX0eNcXODUIaJZJtaDhxpuzxKAABkBQAUDDSEzlnIUhiZOhol452zsSJHj8BHQw0dAsNIHbzuZnWjLMpPwMUjDUU11prHR0VyRSehUUlqswExSRQAtEeZIbWPY6LpnnyStj123f4pIdgGqz5/wCIRb7GZcwod2b1rHkdCKb9Roo8cfRUvN/9irkvAyJ8udolQJA1Tkodnifthb5c6cFywwbcxPEx0dFvJC6i0UUOyS1dI8joYmiQLRuBhtcytewMex0AY9ALBWnwdveIt9miPHB4GOjonk+LLYfmv6Lq87vCsczM4SW3kDfHIt0vwRMCiAM6H6eOjohD3LZ2ZXwlr6Ya3LfCJ0lKkgpBFEnMNTSmkBO2M4G00/ID0c/OPY6Lp2iU1UUyuu+950kvKmKTvGYPMGhiLYryw2oWiYCr7xS1AM5JJNOpjo6MiDYe2fbuQQHlzBx8p+MdeG3MkD7pClK/V5U9WLmOjoNs1sFr42rtM4EFWBJFQjyuOJz9YFJhrHsdBQrCO4JwTJJNPMz9BuEEtjIXL37jrHsdE/J1Y3pL9CTZKuFDqDE2+rKHBNcIHrl8Y6OjeB/I7cE5KXJoAK00f5PAjt3NBVJ4oURyMxTegjo6GiRy9FTszMa0yj+r4GNFmzo6OiGfsr+LuLEmcGoKw0Jpjo6IHXR39aN/vjyOjoxqP//Z"]},
-}
+CONTENT_BY_LABEL = (
+    load_content_manifest(CONTENT_MANIFEST, os.stat(CONTENT_MANIFEST).st_mtime_ns, tuple(labels))
+    if os.path.exists(CONTENT_MANIFEST) else {}
+)
 
 # ======================
 # 유틸
 # ======================
-def load_pil_from_bytes(b: bytes) -> Image.Image:
-    pil = Image.open(BytesIO(b))
-    pil = ImageOps.exif_transpose(pil)
-    if pil.mode != "RGB": pil = pil.convert("RGB")
+MAX_IMAGE_PIXELS = int(st.secrets.get("MAX_IMAGE_PIXELS", 50_000_000))  # 디컴프레션 폭탄 방지
+PREVIEW_SIDE = int(st.secrets.get("PREVIEW_SIDE", 512))
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+IMG_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".tiff", ".tif")
+BATCH_SIZE = int(st.secrets.get("BATCH_SIZE", 32))
+BATCH_MAX_FILES = int(st.secrets.get("BATCH_MAX_FILES", 2000))
+DECODE_WORKERS = int(st.secrets.get("DECODE_WORKERS", min(8, (os.cpu_count() or 2) + 2)))
+BATCH_MAX_FILE_BYTES = int(st.secrets.get("BATCH_MAX_FILE_BYTES", 50 * 1024 * 1024))
+BATCH_MAX_TOTAL_BYTES = int(st.secrets.get("BATCH_MAX_TOTAL_BYTES", 1024 * 1024 * 1024))
+ZIP_ERRORS = (zipfile.BadZipFile, RuntimeError, OSError, EOFError, NotImplementedError, zlib.error)
+
+def iter_uploaded_images(files, skipped: list):
+    """업로드 파일들(이미지 또는 zip)을 (이름, 바이트)로 펼침.
+    zip 멤버는 압축 해제 전에 헤더의 크기로 파일당/전체 상한을 검사하고, 건너뛴 항목은 skipped 에 기록."""
+    total = 0
+    def _admit(name: str, size: int) -> bool:
+        if size > BATCH_MAX_FILE_BYTES:
+            skipped.append({"file": name, "error": f"파일이 너무 큽니다 ({size:,} 바이트)"})
+            return False
+        if total + size > BATCH_MAX_TOTAL_BYTES:
+            skipped.append({"file": name, "error": f"일괄 처리 총 용량 상한({BATCH_MAX_TOTAL_BYTES:,} 바이트) 초과"})
+            return False
+        return True
+
+    for uf in files:
+        name = uf.name
+        if name.lower().endswith(".zip"):
+            try:
+                zf = zipfile.ZipFile(BytesIO(uf.getvalue()))
+            except ZIP_ERRORS as e:
+                skipped.append({"file": name, "error": f"zip 을 열 수 없습니다: {e}"})
+                continue
+            with zf:
+                for info in zf.infolist():
+                    base = os.path.basename(info.filename)
+                    if info.is_dir() or base.startswith(".") or "__MACOSX" in info.filename:
+                        continue
+                    if base.lower().endswith(IMG_EXTS):
+                        member = f"{name}/{info.filename}"
+                        if not _admit(member, info.file_size):
+                            continue
+                        try:
+                            data = zf.read(info)  # ZipExtFile 은 헤더의 file_size 이상 읽지 않음
+                        except ZIP_ERRORS as e:  # 손상(CRC/deflate), 암호화, 미지원 압축 방식
+                            skipped.append({"file": member, "error": f"압축 해제 실패: {e}"})
+                            continue
+                        total += len(data)
+                        yield member, data
+        elif name.lower().endswith(IMG_EXTS) and _admit(name, uf.size):
+            total += uf.size
+            yield name, uf.getvalue()
+
+MODEL_SIDE = max(model_input_size(learner))
+# 모델로 들어가는 모든 경로(단일/일괄)가 같은 크기로 디코드해야 캐시된 확률이 경로와 무관하게 같음
+DECODE_SIDE = max(MODEL_SIDE, PREVIEW_SIDE)
+
+def decode_bytes(b: bytes, min_side: int) -> Image.Image:
+    """load_pil_from_bytes + 디코드 시간/입력 크기/오류 계측."""
+    t0 = time.perf_counter()
+    try:
+        pil = load_pil_from_bytes(b, min_side, MAX_IMAGE_PIXELS)
+    except Exception:
+        ERRORS.inc(stage="decode")
+        raise
+    dt = time.perf_counter() - t0
+    STAGE_SECONDS.observe(dt, stage="decode")
+    DECODE_SECONDS.observe(dt, size=size_class(len(b)))
+    INPUT_BYTES.observe(len(b))
     return pil
 
-def yt_id_from_url(url: str) -> str | None:
-    if not url: return None
-    pats = [r"(?:v=|/)([0-9A-Za-z_-]{11})(?:\?|&|/|$)", r"youtu\.be/([0-9A-Za-z_-]{11})"]
-    for p in pats:
-        m = re.search(p, url)
-        if m: return m.group(1)
-    return None
+def decode_many(items, pool: ThreadPoolExecutor):
+    """스레드 풀에서 디코드. 실패한 항목은 (이름, 에러) 로 반환."""
+    def _one(item):
+        name, b = item
+        try:
+            return name, b, decode_bytes(b, DECODE_SIDE), None
+        except Exception as e:
+            return name, b, None, str(e)
+    return list(pool.map(_one, items))
 
-def yt_thumb(url: str) -> str | None:
-    vid = yt_id_from_url(url)
-    return f"https://img.youtube.com/vi/{vid}/hqdefault.jpg" if vid else None
+# ======================
+# 추론 워커 (세션 간 마이크로 배칭)
+# 모든 세션의 요청을 큐에 모아 한 번의 forward 로 처리
+# ======================
+INFER_MAX_BATCH = int(st.secrets.get("INFER_MAX_BATCH", 16))
+INFER_MAX_WAIT_MS = float(st.secrets.get("INFER_MAX_WAIT_MS", 10))
+INFER_QUEUE_MAX = int(st.secrets.get("INFER_QUEUE_MAX", 256))
+INFER_TIMEOUT = float(st.secrets.get("INFER_TIMEOUT", 30))
 
-def pick_top3(lst):
-    return [x for x in lst if isinstance(x, str) and x.strip()][:3]
+@st.cache_resource
+def _worker_slot() -> dict:
+    return {"lock": threading.Lock(), "worker": None, "model_fp": None}
+
+def get_inference_worker(learner, model_fp: str, max_batch: int, max_wait_ms: float, queue_max: int) -> InferenceWorker:
+    """모델 지문이 바뀌었거나 스레드가 죽었으면 새 워커로 교체하고 이전 워커는 정지."""
+    slot = _worker_slot()
+    with slot["lock"]:
+        w = slot["worker"]
+        if w is None or slot["model_fp"] != model_fp or not w.alive:
+            if w is not None:
+                w.stop()
+            w = slot["worker"] = InferenceWorker(learner, max_batch, max_wait_ms, queue_max)
+            slot["model_fp"] = model_fp
+        return w
+
+worker = get_inference_worker(learner, MODEL_FP, INFER_MAX_BATCH, INFER_MAX_WAIT_MS, INFER_QUEUE_MAX)
+
+def submit_timed(pil, **kwargs):
+    """worker.submit + 완료 시점에 request_seconds{label} 기록 (콜백은 워커 스레드에서 실행)."""
+    t0 = time.perf_counter()
+    fut = worker.submit(pil, **kwargs)
+    def _done(f):
+        if not f.cancelled() and f.exception() is None:
+            REQUEST_SECONDS.observe(time.perf_counter() - t0, label=f.result()[0])
+    fut.add_done_callback(_done)
+    return fut
+
+# 캐시/워커 상태는 내보낼 때 콜백으로 읽음 (rerun 마다 현재 객체로 교체)
+REGISTRY.gauge_fn("cache_hits_total", "Prediction cache hits", lambda: pred_cache.hits, "counter")
+REGISTRY.gauge_fn("cache_misses_total", "Prediction cache misses", lambda: pred_cache.misses, "counter")
+REGISTRY.gauge_fn("cache_evictions_total", "Prediction cache evictions", lambda: pred_cache.evictions, "counter")
+REGISTRY.gauge_fn("cache_entries", "Prediction cache entries", lambda: pred_cache.stats()["entries"])
+REGISTRY.gauge_fn("inference_queue_depth", "Requests waiting for the inference worker", worker.qsize)
+REGISTRY.gauge_fn("inference_batches_total", "Forward passes run by the worker", lambda: worker.batches, "counter")
+REGISTRY.gauge_fn("inference_items_total", "Images run by the worker", lambda: worker.items, "counter")
+
+@st.cache_resource
+def warmup_model(_worker, model_fp: str) -> bool:
+    """첫 실제 요청이 느려지지 않도록 더미 이미지로 forward 한 번."""
+    with startup_phase("warmup"):
+        _worker.submit(Image.new("RGB", (224, 224), (127, 127, 127)), block=True).result(timeout=INFER_TIMEOUT * 4)
+    return True
+
+warmup_model(worker, MODEL_FP)
+if st.secrets.get("SHOW_STARTUP_TIMINGS", False) and STARTUP:
+    with st.expander("⏱️ 콜드 스타트 단계별 시간"):
+        import pandas as pd
+        st.table(pd.DataFrame({"phase": list(STARTUP), "ms": [round(v, 1) for v in STARTUP.values()]}))
 
 def get_content_for_label(label: str):
     """라벨명으로 콘텐츠 반환 (texts, images, videos). 없으면 빈 리스트."""
     cfg = CONTENT_BY_LABEL.get(label, {})
-    return (
-        pick_top3(cfg.get("texts", [])),
-        pick_top3(cfg.get("images", [])),
-        pick_top3(cfg.get("videos", [])),
-    )
+    return cfg.get("texts", []), cfg.get("images", []), cfg.get("videos", [])
 
 # ======================
-# 입력(카메라/업로드)
+# 입력(카메라/업로드) — fragment 라서 위젯 조작은 이 영역만 다시 실행
+# 새 이미지가 들어오면 그때만 전체 rerun
 # ======================
-tab_cam, tab_file = st.tabs(["📷 카메라로 촬영", "📁 파일 업로드"])
-new_bytes = None
+def render_batch_result(res: dict):
+    """일괄 처리 결과. session_state 에 두고 그리므로 다운로드 버튼으로 rerun 되어도 유지됨."""
+    import pandas as pd
+    for note in res["notes"]:
+        st.warning(note)
+    if res["table"]:
+        st.dataframe(pd.DataFrame(res["table"]), use_container_width=True, hide_index=True)
+    if res["errors"]:
+        st.warning(f"처리 실패 {len(res['errors'])}건")
+        st.dataframe(pd.DataFrame(res["errors"]), use_container_width=True, hide_index=True)
+    if res["csv"] is not None:
+        c1, c2 = st.columns(2)
+        c1.download_button("CSV 다운로드", res["csv"], file_name="predictions.csv", mime="text/csv")
+        if res["parquet"] is not None:
+            c2.download_button("Parquet 다운로드", res["parquet"],
+                               file_name="predictions.parquet", mime="application/octet-stream")
+        else:
+            c2.caption("Parquet 저장에는 pyarrow 가 필요합니다.")
+    if res["caption"]:
+        st.caption(res["caption"])
 
-with tab_cam:
-    cam = st.camera_input("카메라 스냅샷", label_visibility="collapsed")
-    if cam is not None:
-        new_bytes = cam.getvalue()
+def render_batch_tab():
+    batch_files = st.file_uploader(
+        "여러 이미지 또는 zip 파일을 업로드하세요",
+        type=["jpg","png","jpeg","webp","tiff","tif","zip"], accept_multiple_files=True, key="batch_files")
+    compare_single = st.checkbox("단일 이미지 경로(learner.predict)와 처리량 비교", value=False)
+    if not batch_files:
+        st.session_state.pop("batch_result", None)
+    if batch_files and st.button("일괄 분류 시작", type="primary"):
+        import pandas as pd  # 일괄 처리를 쓸 때만 로드 (콜드 스타트에서 제외)
+        st.session_state.pop("batch_result", None)
+        errors, notes = [], []
+        progress = st.empty()
+        table = st.empty()
+        rows, sample = [], []
+        t_infer, n_infer, n_seen = 0.0, 0, 0
+        halted = ""
+        # 업로드 전체를 미리 펼치지 않고 BATCH_SIZE 씩 꺼내 디코드/추론 → 메모리는 한 묶음 분량만
+        images = iter_uploaded_images(batch_files, errors)
+        with ThreadPoolExecutor(max_workers=DECODE_WORKERS) as pool:
+            while n_seen < BATCH_MAX_FILES:
+                chunk = list(islice(images, min(BATCH_SIZE, BATCH_MAX_FILES - n_seen)))
+                if not chunk:
+                    break
+                n_seen += len(chunk)
+                decoded = decode_many(chunk, pool)
+                todo = []
+                for name, b, pil, err in decoded:
+                    if err:
+                        errors.append({"file": name, "error": err})
+                        continue
+                    if len(sample) < 8:
+                        sample.append(pil)
+                    key = f"{MODEL_FP}:{bytes_digest(b)}"
+                    hit = pred_cache.get(key)
+                    if hit is not None:
+                        rows.append((name, hit[0], hit[2]))
+                    else:
+                        todo.append((name, key, pil))
+                if todo:
+                    t0 = time.perf_counter()
+                    futs = []
+                    for _, _, pil in todo:
+                        try:
+                            futs.append(submit_timed(pil, block=True, timeout=INFER_TIMEOUT))
+                        except queue.Full:
+                            # 대기열이 계속 가득 참 → 여기까지의 결과만 보여주고 중단
+                            ERRORS.inc(stage="queue_full")
+                            halted = "추론 대기열이 가득 차"
+                            break
+                        except RuntimeError:  # 모델 교체로 워커가 종료됨
+                            ERRORS.inc(stage="request")
+                            halted = "모델이 교체되어"
+                            break
+                    for (name, key, _), fut in zip(todo, futs):
+                        try:
+                            res = fut.result(timeout=INFER_TIMEOUT)
+                        except FutureTimeout:
+                            fut.cancel()
+                            ERRORS.inc(stage="timeout")
+                            errors.append({"file": name, "error": f"추론 시간 초과 ({INFER_TIMEOUT:.0f}초)"})
+                            continue
+                        except Exception as e:
+                            errors.append({"file": name, "error": f"추론 실패: {e!r}"})
+                            continue
+                        PREDICTIONS.inc(label=res[0])
+                        pred_cache.put(key, res)
+                        rows.append((name, res[0], res[2]))
+                    t_infer += time.perf_counter() - t0
+                    n_infer += len(futs)
+                progress.caption(f"{n_seen}장 처리 중… (성공 {len(rows)} · 실패 {len(errors)})")
+                table.dataframe(
+                    pd.DataFrame([{"file": n, "pred": p, "prob": float(pr.max())} for n, p, pr in rows]),
+                    use_container_width=True, hide_index=True)
+                if halted:
+                    notes.append(f"{halted} {n_seen}장 중 {len(rows)}장만 처리했습니다. 잠시 후 나머지를 다시 시도해 주세요.")
+                    break
+            if not halted and n_seen >= BATCH_MAX_FILES and next(images, None) is not None:
+                notes.append(f"최대 {BATCH_MAX_FILES}장까지만 처리합니다.")
+        images.close()
+        progress.empty()
+        table.empty()
 
-with tab_file:
-    f = st.file_uploader("이미지를 업로드하세요 (jpg, png, jpeg, webp, tiff)",
-                         type=["jpg","png","jpeg","webp","tiff"])
-    if f is not None:
-        new_bytes = f.getvalue()
+        csv = parquet = None
+        if rows:
+            df = pd.DataFrame([pr for _, _, pr in rows], columns=labels)
+            df.insert(0, "pred", [p for _, p, _ in rows])
+            df.insert(0, "file", [n for n, _, _ in rows])
+            csv = df.to_csv(index=False).encode("utf-8-sig")
+            try:
+                pq = BytesIO()
+                df.to_parquet(pq, index=False)
+                parquet = pq.getvalue()
+            except ImportError:
+                pass
 
-if new_bytes:
-    st.session_state.img_bytes = new_bytes
+        caption = ""
+        if n_infer:
+            batch_ms = t_infer / n_infer * 1000
+            caption = f"일괄 추론: {batch_ms:.1f} ms/장 ({n_infer / t_infer:.1f} 장/초)"
+            if compare_single and sample:
+                t0 = time.perf_counter()
+                if INFER_BACKEND == "torchscript":
+                    to_item = lambda pil: pil
+                else:
+                    from fastai.vision.core import PILImage
+                    to_item = lambda pil: PILImage.create(np.array(pil))
+                with worker.lock:
+                    for pil in sample:
+                        learner.predict(to_item(pil))
+                single_ms = (time.perf_counter() - t0) / max(1, len(sample)) * 1000
+                caption += f" · 단일 경로: {single_ms:.1f} ms/장 (×{single_ms / batch_ms:.1f})"
+
+        st.session_state.batch_result = {
+            "notes": notes, "errors": errors, "csv": csv, "parquet": parquet, "caption": caption,
+            "table": [{"file": n, "pred": p, "prob": float(pr.max())} for n, p, pr in rows],
+        }
+
+    if "batch_result" in st.session_state:
+        render_batch_result(st.session_state.batch_result)
+
+@st.fragment
+def input_panel():
+    tab_cam, tab_file, tab_batch = st.tabs(["📷 카메라로 촬영", "📁 파일 업로드", "📦 일괄 분류"])
+    new_bytes = None
+
+    with tab_cam:
+        cam = st.camera_input("카메라 스냅샷", label_visibility="collapsed")
+        if cam is not None:
+            new_bytes = cam.getvalue()
+
+    with tab_file:
+        f = st.file_uploader("이미지를 업로드하세요 (jpg, png, jpeg, webp, tiff)",
+                             type=["jpg","png","jpeg","webp","tiff","tif"])
+        if f is not None:
+            new_bytes = f.getvalue()
+
+    with tab_batch:
+        render_batch_tab()
+
+    if new_bytes and new_bytes != st.session_state.img_bytes:
+        st.session_state.img_bytes = new_bytes
+        st.rerun()
+
+input_panel()
 
 # ======================
-# 예측 & 레이아웃
+# 예측 & 레이아웃 — 미리보기 / 예측 / 확률 막대 / 콘텐츠 패널을 각각 fragment 로
 # ======================
-if st.session_state.img_bytes:
-    top_l, top_r = st.columns([1, 1], vertical_alignment="center")
+PROB_TOP_K = int(st.secrets.get("PROB_TOP_K", 20))
 
-    pil_img = load_pil_from_bytes(st.session_state.img_bytes)
-    with top_l:
-        st.image(pil_img, caption="입력 이미지", use_container_width=True)
+def get_decoded(img_bytes: bytes) -> Image.Image:
+    """업로드 바이트를 한 번만 디코드해 세션에 보관."""
+    digest = bytes_digest(img_bytes)
+    cached = st.session_state.get("decoded")
+    if cached and cached[0] == digest:
+        return cached[1]
+    pil = decode_bytes(img_bytes, DECODE_SIDE)
+    st.session_state.decoded = (digest, pil)
+    return pil
 
-    with st.spinner("🧠 분석 중..."):
-        pred, pred_idx, probs = learner.predict(PILImage.create(np.array(pil_img)))
-        st.session_state.last_prediction = str(pred)
+@st.fragment
+@timed("render_preview")
+def preview_panel(pil_img: Image.Image):
+    # 디코드는 호출 측에서 끝내고 넘겨받음 → render_preview 에 decode 시간이 섞이지 않음
+    st.image(make_preview(pil_img, PREVIEW_SIDE),
+             caption="입력 이미지", use_container_width=True, output_format="JPEG")
 
-    with top_r:
-        st.markdown(
-            f"""
-            <div class="prediction-box">
-                <span style="font-size:1.0rem;color:#555;">예측 결과:</span>
-                <h2>{st.session_state.last_prediction}</h2>
-                <div class="helper">오른쪽 패널에서 예측 라벨의 콘텐츠가 표시됩니다.</div>
-            </div>
-            """, unsafe_allow_html=True
-        )
+@st.fragment
+def prediction_panel():
+    img_bytes = st.session_state.img_bytes
+    cache_key = f"{MODEL_FP}:{bytes_digest(img_bytes)}"
+    cached = pred_cache.get(cache_key)
+    if cached is None:
+        error = None
+        with st.spinner("🧠 분석 중..."):
+            try:
+                fut = submit_timed(get_decoded(img_bytes))
+                cached = fut.result(timeout=INFER_TIMEOUT)
+                PREDICTIONS.inc(label=cached[0])
+                pred_cache.put(cache_key, cached)
+            except queue.Full:
+                ERRORS.inc(stage="queue_full")
+                error = "요청이 많아 잠시 후 다시 시도해 주세요. (추론 대기열이 가득 참)"
+            except FutureTimeout:
+                fut.cancel()
+                ERRORS.inc(stage="timeout")
+                error = f"추론 시간이 {INFER_TIMEOUT:.0f}초를 넘었습니다. 잠시 후 다시 시도해 주세요."
+            except Exception as e:
+                # 모델 오류, 모델 교체 중 submit 의 RuntimeError 등 — 패널만 실패시키고 앱은 유지
+                ERRORS.inc(stage="request")
+                error = f"예측 중 오류가 발생했습니다: {e}"
+        if error:
+            st.error(error)
+            st.stop()
+    pred, pred_idx, probs = cached
+    st.session_state.last_prediction = pred
+    st.session_state.last_result = (cache_key, pred, probs)
 
-    left, right = st.columns([1,1], vertical_alignment="top")
+    st.markdown(
+        f"""
+        <div class="prediction-box">
+            <span style="font-size:1.0rem;color:#555;">예측 결과:</span>
+            <h2>{st.session_state.last_prediction}</h2>
+            <div class="helper">오른쪽 패널에서 예측 라벨의 콘텐츠가 표시됩니다.</div>
+        </div>
+        """, unsafe_allow_html=True
+    )
 
-    # 왼쪽: 확률 막대
-    with left:
-        st.subheader("상세 예측 확률")
-        prob_list = sorted(
-            [(labels[i], float(probs[i])) for i in range(len(labels))],
-            key=lambda x: x[1], reverse=True
-        )
-        for lbl, p in prob_list:
-            pct = p * 100
-            hi = "highlight" if lbl == st.session_state.last_prediction else ""
-            st.markdown(
-                f"""
-                <div class="prob-card">
-                  <div style="display:flex;justify-content:space-between;margin-bottom:6px;">
-                    <strong>{lbl}</strong><span>{pct:.2f}%</span>
-                  </div>
-                  <div class="prob-bar-bg">
-                    <div class="prob-bar-fg {hi}" style="width:{pct:.4f}%;"></div>
-                  </div>
-                </div>
-                """, unsafe_allow_html=True
-            )
+@st.fragment
+@timed("render_probs")
+def prob_panel():
+    st.subheader("상세 예측 확률")
+    result = st.session_state.get("last_result")
+    if not result:
+        return
+    cache_key, pred, probs = result
+    show_all = len(labels) <= PROB_TOP_K or st.toggle(f"전체 {len(labels)}개 라벨 보기", value=False)
+    top_k = len(labels) if show_all else PROB_TOP_K
+    memo = st.session_state.get("prob_html")
+    if not memo or memo[0] != (cache_key, top_k):
+        order = np.argsort(-np.asarray(probs))[:top_k]
+        html = render_prob_bars([(labels[i], float(probs[i])) for i in order], pred)
+        memo = st.session_state.prob_html = ((cache_key, top_k), html)
+    st.markdown(memo[1], unsafe_allow_html=True)
 
-    # 오른쪽: 정보 패널 (예측 라벨 기본, 다른 라벨로 바꿔보기 가능)
-    with right:
-        st.subheader("라벨별 고정 콘텐츠")
-        default_idx = labels.index(st.session_state.last_prediction) if st.session_state.last_prediction in labels else 0
-        info_label = st.selectbox("표시할 라벨 선택", options=labels, index=default_idx)
+@st.fragment
+@timed("render_content")
+def content_panel():
+    st.subheader("라벨별 고정 콘텐츠")
+    default_idx = labels.index(st.session_state.last_prediction) if st.session_state.last_prediction in labels else 0
+    info_label = st.selectbox("표시할 라벨 선택", options=labels, index=default_idx)
 
-        texts, images, videos = get_content_for_label(info_label)
+    texts, images, videos = get_content_for_label(info_label)
 
-        if not any([texts, images, videos]):
-            st.info(f"라벨 `{info_label}`에 대한 콘텐츠가 아직 없습니다. 코드의 CONTENT_BY_LABEL에 추가하세요.")
-        else:
-            # 텍스트
-            if texts:
-                st.markdown('<div class="info-grid">', unsafe_allow_html=True)
-                for t in texts:
+    if not any([texts, images, videos]):
+        st.info(f"라벨 `{info_label}`에 대한 콘텐츠가 아직 없습니다. content/content.src.json 에 추가하고 build_content.py 를 실행하세요.")
+    else:
+        # 텍스트
+        if texts:
+            st.markdown('<div class="info-grid">', unsafe_allow_html=True)
+            for t in texts:
+                st.markdown(f"""
+                <div class="card" style="grid-column:span 12;">
+                  <h4>텍스트</h4>
+                  <div>{t}</div>
+                </div>
+                """, unsafe_allow_html=True)
+            st.markdown('</div>', unsafe_allow_html=True)
+
+        # 이미지(최대 3, 3열)
+        if images:
+            st.markdown('<div class="info-grid">', unsafe_allow_html=True)
+            for img in images:
+                dims = f'width="{img["width"]}" height="{img["height"]}"' if "width" in img else ""
+                st.markdown(f"""
+                <div class="card" style="grid-column:span 4;">
+                  <h4>이미지</h4>
+                  <img src="{img["src"]}" class="thumb" loading="lazy" {dims} />
+                </div>
+                """, unsafe_allow_html=True)
+            st.markdown('</div>', unsafe_allow_html=True)
+
+        # 동영상(유튜브 썸네일)
+        if videos:
+            st.markdown('<div class="info-grid">', unsafe_allow_html=True)
+            for video in videos:
+                v, thumb = video["url"], video.get("thumb")
+                if thumb:
                     st.markdown(f"""
-                    <div class="card" style="grid-column:span 12;">
-                      <h4>텍스트</h4>
-                      <div>{t}</div>
+                    <div class="card" style="grid-column:span 6;">
+                      <h4>동영상</h4>
+                      <a href="{v}" target="_blank" class="thumb-wrap">
+                        <img src="{thumb}" class="thumb" loading="lazy"/>
+                        <div class="play"></div>
+                      </a>
+                      <div class="helper">{v}</div>
                     </div>
                     """, unsafe_allow_html=True)
-                st.markdown('</div>', unsafe_allow_html=True)
-
-            # 이미지(최대 3, 3열)
-            if images:
-                st.markdown('<div class="info-grid">', unsafe_allow_html=True)
-                for url in images[:3]:
+                else:
                     st.markdown(f"""
-                    <div class="card" style="grid-column:span 4;">
-                      <h4>이미지</h4>
-                      <img src="{url}" class="thumb" />
+                    <div class="card" style="grid-column:span 6;">
+                      <h4>동영상</h4>
+                      <a href="{v}" target="_blank">{v}</a>
                     </div>
                     """, unsafe_allow_html=True)
-                st.markdown('</div>', unsafe_allow_html=True)
-
-            # 동영상(유튜브 썸네일)
-            if videos:
-                st.markdown('<div class="info-grid">', unsafe_allow_html=True)
-                for v in videos[:3]:
-                    thumb = yt_thumb(v)
-                    if thumb:
-                        st.markdown(f"""
-                        <div class="card" style="grid-column:span 6;">
-                          <h4>동영상</h4>
-                          <a href="{v}" target="_blank" class="thumb-wrap">
-                            <img src="{thumb}" class="thumb"/>
-                            <div class="play"></div>
-                          </a>
-                          <div class="helper">{v}</div>
-                        </div>
-                        """, unsafe_allow_html=True)
-                    else:
-                        st.markdown(f"""
-                        <div class="card" style="grid-column:span 6;">
-                          <h4>동영상</h4>
-                          <a href="{v}" target="_blank">{v}</a>
-                        </div>
-                        """, unsafe_allow_html=True)
+
+if st.session_state.img_bytes:
+    try:
+        pil_img = get_decoded(st.session_state.img_bytes)
+    except Exception as e:
+        st.session_state.img_bytes = None
+        st.error(f"이미지를 읽을 수 없습니다: {e}")
+        st.stop()
+
+    top_l, top_r = st.columns([1, 1], vertical_alignment="center")
+    with top_l:
+        preview_panel(pil_img)
+    with top_r:
+        prediction_panel()
+
+    left, right = st.columns([1,1], vertical_alignment="top")
+    # 왼쪽: 확률 막대
+    with left:
+        prob_panel()
+    # 오른쪽: 정보 패널 (예측 라벨 기본, 다른 라벨로 바꿔보기 가능)
+    with right:
+        content_panel()
 else:
     st.info("카메라로 촬영하거나 파일을 업로드하면 분석 결과와 라벨별 콘텐츠가 표시됩니다.")
+
+# ======================
+# 관리자 메트릭 패널 (SHOW_METRICS_PANEL + ?admin=ADMIN_TOKEN)
+# ======================
+if SHOW_METRICS_PANEL and is_admin():
+    with st.sidebar:
+        import pandas as pd
+        st.subheader("📊 메트릭")
+        cs = pred_cache.stats()
+        total = cs["hits"] + cs["misses"]
+        c1, c2, c3 = st.columns(3)
+        c1.metric("캐시 적중률", f"{cs['hits'] / total:.0%}" if total else "-")
+        c2.metric("대기열", worker.qsize())
+        c3.metric("배치 평균", f"{worker.items / worker.batches:.1f}" if worker.batches else "-")
+        rows = []
+        for hist in (STAGE_SECONDS, DECODE_SECONDS, REQUEST_SECONDS):
+            for key, (count, total_s) in sorted(hist.series().items()):
+                p95 = hist.quantile(0.95, **dict(key))
+                if p95 is None:
+                    p95_ms = "-"
+                elif p95 == float("inf"):  # 마지막 버킷을 넘음 → 상한을 모르므로 가장 큰 유한 경계만
+                    p95_ms = f"≥{hist.buckets[-1] * 1000:g}"
+                else:
+                    p95_ms = f"≤{p95 * 1000:g}"
+                rows.append({
+                    "metric": hist.name.removeprefix("ai3_"), "label": ",".join(str(v) for _, v in key),
+                    "n": count, "mean_ms": round(total_s / count * 1000, 1), "p95_ms": p95_ms,
+                })
+        if rows:
+            st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        st.download_button("Prometheus 텍스트", REGISTRY.render(), file_name="metrics.prom", mime="text/plain")
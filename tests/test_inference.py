@@ -0,0 +1,143 @@
+import time, queue, threading
+from concurrent.futures import CancelledError
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from inference import InferenceWorker, PredictionCache
+from metrics import Registry
+
+BAD = -1
+TIMEOUT = 5
+
+class StubLearner:
+    """predict_batch 를 가진 learner (TorchScript 백엔드와 같은 경로). gate 로 forward 를 멈춰 둘 수 있음."""
+
+    def __init__(self):
+        self.dls = SimpleNamespace(vocab=["a", "b", "c"])
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.entered = threading.Event()
+
+    def predict_batch(self, items):
+        self.entered.set()
+        assert self.gate.wait(TIMEOUT)
+        self.batches.append(list(items))
+        if BAD in items:
+            raise ValueError("bad image")
+        return np.stack([np.eye(3)[i % 3] for i in items])
+
+@pytest.fixture
+def learner():
+    return StubLearner()
+
+def make_worker(learner, max_batch=4, queue_max=64, registry=None):
+    return InferenceWorker(learner, max_batch=max_batch, max_wait_ms=20, queue_max=queue_max,
+                           registry=registry or Registry())
+
+def hold(worker, learner):
+    """워커를 첫 요청의 forward 안에 멈춰 두고 그 Future 를 돌려줌."""
+    learner.gate.clear()
+    fut = worker.submit(100, block=True)
+    assert learner.entered.wait(TIMEOUT)
+    return fut
+
+def test_batches_up_to_max_batch(learner):
+    worker = make_worker(learner, max_batch=4)
+    first = hold(worker, learner)
+    futs = [worker.submit(i, block=True) for i in range(10)]
+    learner.gate.set()
+    results = [f.result(TIMEOUT) for f in futs]
+    first.result(TIMEOUT)
+    assert [len(b) for b in learner.batches] == [1, 4, 4, 2]
+    assert [r[0] for r in results] == [["a", "b", "c"][i % 3] for i in range(10)]
+    assert worker.batches == 4 and worker.items == 11
+    worker.stop()
+
+def test_failing_item_is_isolated(learner):
+    registry = Registry()
+    worker = make_worker(learner, max_batch=8, registry=registry)
+    first = hold(worker, learner)
+    futs = [worker.submit(i, block=True) for i in (0, BAD, 1)]
+    learner.gate.set()
+    first.result(TIMEOUT)
+    assert futs[0].result(TIMEOUT)[0] == "a"
+    assert futs[2].result(TIMEOUT)[0] == "b"
+    with pytest.raises(ValueError):
+        futs[1].result(TIMEOUT)
+    assert 'errors_total{stage="predict"} 1' in registry.render()
+    assert worker.alive
+    worker.stop()
+
+def test_queue_full_raises(learner):
+    worker = make_worker(learner, queue_max=1)
+    first = hold(worker, learner)
+    queued = worker.submit(0)
+    with pytest.raises(queue.Full):
+        worker.submit(1)
+    with pytest.raises(queue.Full):
+        worker.submit(1, block=True, timeout=0.05)
+    learner.gate.set()
+    assert first.result(TIMEOUT)[0] == "b"
+    assert queued.result(TIMEOUT)[0] == "a"
+    worker.stop()
+
+def test_cancelled_futures_are_skipped(learner):
+    worker = make_worker(learner, max_batch=8)
+    first = hold(worker, learner)
+    keep, drop = worker.submit(0, block=True), worker.submit(1, block=True)
+    assert drop.cancel()
+    learner.gate.set()
+    first.result(TIMEOUT)
+    assert keep.result(TIMEOUT)[0] == "a"
+    with pytest.raises(CancelledError):
+        drop.result(TIMEOUT)
+    assert [b for b in learner.batches if 1 in b] == []
+    worker.stop()
+
+def test_stop_drains_queue_and_releases_learner(learner):
+    worker = make_worker(learner, max_batch=2)
+    first = hold(worker, learner)
+    pending = [worker.submit(i, block=True) for i in range(5)]
+    worker.stop()
+    with pytest.raises(RuntimeError):
+        worker.submit(0)
+    learner.gate.set()
+    worker.join(TIMEOUT)
+    assert not worker.alive and worker.learner is None
+    assert first.result(TIMEOUT)[0] == "b"
+    for fut in pending:
+        assert fut.done()
+        with pytest.raises(RuntimeError):
+            fut.result(0)
+
+def test_worker_survives_unexpected_errors(learner):
+    learner.dls.vocab = []  # labels[idx] 에서 IndexError — forward 밖의 오류
+    registry = Registry()
+    worker = make_worker(learner, registry=registry)
+    with pytest.raises(IndexError):
+        worker.submit(0, block=True).result(TIMEOUT)
+    assert worker.alive
+    assert 'errors_total{stage="worker"} 1' in registry.render()
+    worker.stop()
+
+def test_cache_lru_and_model_binding():
+    probs = np.zeros(3, dtype=np.float32)
+    cache = PredictionCache(max_entries=2, max_bytes=1 << 20, ttl=0)
+    cache.bind_model("m1")
+    cache.put("k1", ("a", 0, probs))
+    cache.put("k2", ("b", 1, probs))
+    assert cache.get("k1")[0] == "a"  # k1 을 최근으로
+    cache.put("k3", ("c", 2, probs))
+    assert cache.get("k2") is None and cache.get("k1") is not None
+    cache.bind_model("m2")
+    assert cache.stats()["entries"] == 0
+
+def test_cache_ttl_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = PredictionCache(max_entries=8, max_bytes=1 << 20, ttl=10)
+    cache.put("k", ("a", 0, np.zeros(3)))
+    now[0] += 11
+    assert cache.get("k") is None
+    assert cache.stats()["evictions"] == 1
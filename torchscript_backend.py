@@ -0,0 +1,213 @@
+# torchscript_backend.py
+# model.pkl(fastai Learner) → TorchScript(+선택적 int8 동적 양자화) 내보내기와
+# 앱에서 쓰는 경량 CPU 추론 백엔드.
+#
+# 내보내기:
+#   python torchscript_backend.py model.pkl --out model.ts --quantize --threads 4 --samples ./samples
+#
+# 리사이즈/크롭은 PIL 에서(fastai Resize 와 같은 규칙), 0~255 → float, 정규화, softmax 는
+# 추적된 그래프 안에 들어감. 앱은 INFER_BACKEND="torchscript", TS_MODEL_PATH 로 선택.
+import os, sys, json, time, argparse, subprocess
+from types import SimpleNamespace
+import numpy as np
+import torch
+from PIL import Image
+
+META_SUFFIX = ".json"
+
+# ======================
+# 전처리 (fastai Resize 규칙 재현)
+# ======================
+def resize_like_fastai(pil: Image.Image, size: tuple[int, int], method: str = "crop") -> Image.Image:
+    """size = (w, h). 검증 시 fastai Resize 와 동일하게 중앙 crop/pad 후 BILINEAR 리사이즈."""
+    if pil.mode != "RGB": pil = pil.convert("RGB")
+    w, h = pil.size
+    tw, th = size
+    if method == "squish":
+        return pil.resize((tw, th), Image.BILINEAR)
+    rw, rh = w / tw, h / th
+    m = min(rw, rh) if method == "crop" else max(rw, rh)
+    cw, ch = int(m * tw), int(m * th)
+    left, top = int(0.5 * (w - cw)), int(0.5 * (h - ch))
+    if method == "crop":
+        pil = pil.crop((left, top, left + cw, top + ch))
+    else:  # pad: fastai 기본은 reflection 이지만 여기서는 0 패딩으로 근사
+        canvas = Image.new("RGB", (cw, ch))
+        canvas.paste(pil, (-left, -top))
+        pil = canvas
+    return pil.resize((tw, th), Image.BILINEAR)
+
+class _Classifier(torch.nn.Module):
+    """uint8 NHWC 배치 → 확률. 스케일/정규화/softmax 를 그래프에 포함."""
+
+    def __init__(self, model: torch.nn.Module, mean: torch.Tensor, std: torch.Tensor):
+        super().__init__()
+        self.model = model
+        self.register_buffer("mean", mean.reshape(1, -1, 1, 1).float())
+        self.register_buffer("std", std.reshape(1, -1, 1, 1).float())
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        x = x.permute(0, 3, 1, 2).float().div(255.0)
+        x = (x - self.mean) / self.std
+        return torch.softmax(self.model(x), dim=1)
+
+def learner_preprocess_spec(learner) -> dict:
+    """learner.dls 의 Resize / Normalize 설정을 읽어 메타데이터로."""
+    size, method = (224, 224), "crop"
+    for tfm in learner.dls.after_item.fs:
+        if hasattr(tfm, "size") and tfm.size is not None:
+            size = (int(tfm.size[0]), int(tfm.size[1]))
+            method = str(getattr(tfm, "method", "crop"))
+    mean, std = [0.0, 0.0, 0.0], [1.0, 1.0, 1.0]
+    for tfm in learner.dls.after_batch.fs:
+        if type(tfm).__name__ == "Normalize":
+            mean = [float(v) for v in tfm.mean.flatten()]
+            std = [float(v) for v in tfm.std.flatten()]
+    return {"size": size, "method": method, "mean": mean, "std": std,
+            "labels": [str(x) for x in learner.dls.vocab]}
+
+# ======================
+# 런타임 백엔드
+# ======================
+class TorchScriptClassifier:
+    """fastai Learner 의 추론 부분(dls.vocab, predict)만 흉내내는 경량 백엔드."""
+
+    def __init__(self, path: str, num_threads: int | None = None):
+        if num_threads: torch.set_num_threads(int(num_threads))
+        with open(path + META_SUFFIX, encoding="utf-8") as fp:
+            self.meta = json.load(fp)
+        self.module = torch.jit.load(path, map_location="cpu").eval()
+        self.size = tuple(self.meta["size"])
+        self.method = self.meta.get("method", "crop")
+        self.dls = SimpleNamespace(vocab=list(self.meta["labels"]))
+
+    def preprocess(self, pil: Image.Image) -> np.ndarray:
+        return np.asarray(resize_like_fastai(pil, self.size, self.method), dtype=np.uint8)
+
+    def predict_batch(self, pils) -> np.ndarray:
+        x = torch.from_numpy(np.stack([self.preprocess(p) for p in pils]))
+        with torch.inference_mode():
+            return self.module(x).numpy()
+
+    def predict(self, pil):
+        probs = self.predict_batch([pil])[0]
+        idx = int(probs.argmax())
+        return self.dls.vocab[idx], torch.tensor(idx), torch.from_numpy(probs)
+
+# ======================
+# 내보내기 + 검증
+# ======================
+def rss_mb() -> float:
+    """현재 RSS. psutil 이 없으면 최대 RSS(ru_maxrss)로 근사 — 새 프로세스 안에서만 의미 있음."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / 2**20 if sys.platform == "darwin" else rss / 1024  # macOS 는 바이트, Linux 는 KB
+
+_LOAD_PROBE = """
+import sys, json
+sys.path.insert(0, sys.argv[3])
+from torchscript_backend import rss_mb, TorchScriptClassifier
+if sys.argv[1] == "fastai":
+    import fastai.vision.all
+    from fastai.learner import load_learner
+    m0 = rss_mb(); obj = load_learner(sys.argv[2], cpu=True)
+else:
+    m0 = rss_mb(); obj = TorchScriptClassifier(sys.argv[2])
+print(json.dumps(rss_mb() - m0))
+"""
+
+def load_memory_mb(kind: str, path: str) -> float | None:
+    """백엔드 하나를 별도 프로세스에서 로드해 import 이후 증가한 RSS(MB)를 잰다.
+    같은 프로세스에서 재면 먼저 로드한 모델/라이브러리 때문에 값이 왜곡됨."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    try:
+        out = subprocess.run([sys.executable, "-c", _LOAD_PROBE, kind, os.path.abspath(path), root],
+                             capture_output=True, text=True, timeout=600, check=True)
+        return float(json.loads(out.stdout.strip().splitlines()[-1]))
+    except (subprocess.SubprocessError, OSError, ValueError, IndexError):
+        return None
+
+def export(learner, out_path: str, quantize: bool = False) -> dict:
+    spec = learner_preprocess_spec(learner)
+    model = learner.model.eval().cpu()
+    if quantize:
+        # 동적 양자화는 Linear 계층(분류 헤드)에만 적용됨
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    wrapped = _Classifier(model, torch.tensor(spec["mean"]), torch.tensor(spec["std"])).eval()
+    w, h = spec["size"]
+    example = torch.zeros(1, h, w, 3, dtype=torch.uint8)
+    with torch.inference_mode():
+        traced = torch.jit.freeze(torch.jit.trace(wrapped, example))
+    traced.save(out_path)
+    spec["quantized"] = bool(quantize)
+    with open(out_path + META_SUFFIX, "w", encoding="utf-8") as fp:
+        json.dump(spec, fp, ensure_ascii=False, indent=2)
+    return spec
+
+def load_samples(folder: str | None, n: int, size: tuple[int, int]) -> list[Image.Image]:
+    if folder:
+        exts = (".jpg", ".jpeg", ".png", ".webp", ".tiff", ".tif")
+        files = sorted(f for f in os.listdir(folder) if f.lower().endswith(exts))[:n]
+        return [Image.open(os.path.join(folder, f)).convert("RGB") for f in files]
+    print("⚠️ --samples 가 없어 무작위 이미지로 검증합니다 (라벨 일치율은 참고용).", file=sys.stderr)
+    rng = np.random.default_rng(0)
+    return [Image.fromarray(rng.integers(0, 256, (size[1] * 2, size[0] * 2, 3), dtype=np.uint8)) for _ in range(n)]
+
+def parity_report(learner, backend: TorchScriptClassifier, pils) -> dict:
+    from fastai.vision.all import PILImage
+    agree, deltas, t_ref, t_ts = 0, [], 0.0, 0.0
+    for pil in pils:
+        t0 = time.perf_counter()
+        pred, _, probs = learner.predict(PILImage.create(np.array(pil)))
+        t_ref += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        ts_pred, _, ts_probs = backend.predict(pil)
+        t_ts += time.perf_counter() - t0
+        agree += str(pred) == ts_pred
+        deltas.append(float((probs.float() - ts_probs).abs().max()))
+    n = max(1, len(pils))
+    return {"samples": len(pils), "top1_agreement": agree / n,
+            "max_prob_delta": max(deltas, default=0.0), "mean_prob_delta": sum(deltas) / n,
+            "learner_ms": t_ref / n * 1000, "torchscript_ms": t_ts / n * 1000}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="model.pkl → TorchScript 내보내기 + 일치도 검증")
+    ap.add_argument("model", nargs="?", default="model.pkl")
+    ap.add_argument("--out", default="model.ts")
+    ap.add_argument("--quantize", action="store_true", help="int8 동적 양자화 (Linear)")
+    ap.add_argument("--threads", type=int, default=None, help="torch.set_num_threads")
+    ap.add_argument("--samples", default=None, help="검증용 이미지 폴더")
+    ap.add_argument("--n", type=int, default=32)
+    ap.add_argument("--min-agreement", type=float, default=0.99)
+    ap.add_argument("--max-delta", type=float, default=0.05)
+    args = ap.parse_args(argv)
+
+    from fastai.vision.all import load_learner
+    if args.threads: torch.set_num_threads(args.threads)
+
+    learner = load_learner(args.model, cpu=True)
+    spec = export(learner, args.out, quantize=args.quantize)
+    backend = TorchScriptClassifier(args.out, args.threads)
+
+    report = parity_report(learner, backend, load_samples(args.samples, args.n, tuple(spec["size"])))
+    # 메모리는 백엔드마다 새 프로세스에서 측정 (실패하면 null — 틀린 값보다 낫다)
+    report.update({"learner_load_mb": load_memory_mb("fastai", args.model),
+                   "torchscript_load_mb": load_memory_mb("torchscript", args.out),
+                   "file_mb_pkl": os.path.getsize(args.model) / 2**20,
+                   "file_mb_ts": os.path.getsize(args.out) / 2**20})
+    spec["parity"] = report
+    with open(args.out + META_SUFFIX, "w", encoding="utf-8") as fp:
+        json.dump(spec, fp, ensure_ascii=False, indent=2)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    ok = report["top1_agreement"] >= args.min_agreement and report["max_prob_delta"] <= args.max_delta
+    if not ok:
+        print("❌ 일치도 검증 실패", file=sys.stderr)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())